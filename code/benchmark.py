@@ -0,0 +1,390 @@
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+#
+#   Benchmarks of graph generation, information assignment, the walks and
+#   the plotter. Every case runs in a fresh process so that its peak RSS is
+#   its own, is repeated and keeps its fastest run. Graph sizes are given in
+#   nodes and turned into a number of clusters of avgcl nodes on average.
+#
+#   Walks are timed on each engine:
+#       networkx  walking.py on a graph_erdos graph (the reference)
+#       csr       the single walks of csr_walking.py, one test after the other
+#       batch     csr_walking.walk_batch, all the tests in lockstep
+#       compiled  walk_kernels.walk_compiled (numba, or its fallback)
+#
+#   Example:
+#       python benchmark.py --nodes 100 1000 10000 --output bench.json
+#       python benchmark.py --nodes 100 1000 10000 --compare bench.json
+#   The second run exits with status 1 if a case became slower than the
+#   saved one by more than --threshold.
+#
+
+ENGINES = ('networkx', 'csr', 'batch', 'compiled')
+METHODS = ('random', 'ars', 'pagerank')
+
+
+def _n_clusters(n_nodes, avgcl):
+    # cluster sizes are 2 + Exp(avgcl)
+    return max(1, round(n_nodes / (avgcl + 2)))
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 ** 2 if sys.platform == 'darwin' else 1024)
+
+
+def _best_time(run, repeat, before=None):
+    best = float('inf')
+    for _ in range(repeat):
+        if before is not None:
+            before()
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+#
+#   Cases. Each one builds what it needs (untimed), times the operation and
+#   returns its measurements.
+#
+
+
+def bench_g_make(p):
+    import cluster_erdos as ce
+    n_clusters = _n_clusters(p['nodes'], p['avgcl'])
+    wall = _best_time(lambda: ce.g_make(n_clusters, p['avgcl'], p['mc'], p['mi'], p['seed']), p['repeat'])
+    return {'wall': wall}
+
+
+def bench_g_make_edges(p):
+    import cluster_erdos as ce
+    n_clusters = _n_clusters(p['nodes'], p['avgcl'])
+    wall = _best_time(lambda: ce.g_make_edges(n_clusters, p['avgcl'], p['mc'], p['mi'], p['seed']), p['repeat'])
+    return {'wall': wall}
+
+
+def bench_graph_erdos(p):
+    from graph import graph_erdos
+    n_clusters = _n_clusters(p['nodes'], p['avgcl'])
+    wall = _best_time(lambda: graph_erdos(n_clusters, p['avgcl'], p['mc'], p['mi'], p['tests'], p['seed']),
+                      p['repeat'])
+    return {'wall': wall}
+
+
+def bench_graph_add_information(p):
+    from graph import graph_add_information, graph_erdos
+    n_clusters = _n_clusters(p['nodes'], p['avgcl'])
+    graphs = []
+
+    def fresh_graph():
+        # graph_add_information is incremental, time it on a graph without information
+        graphs[:] = [graph_erdos(n_clusters, p['avgcl'], p['mc'], p['mi'], p['tests'], p['seed'])]
+
+    wall = _best_time(lambda: graph_add_information(graphs[0], p['perc'], rng=p['seed']), p['repeat'], fresh_graph)
+    return {'wall': wall}
+
+
+def _walk_setup(p):
+    # graph and information for the walk cases, in the form the engine needs
+    from graph import csr_erdos, graph_add_information, graph_erdos
+    from sweep import coverage_information
+    n_clusters = _n_clusters(p['nodes'], p['avgcl'])
+    if p['engine'] == 'networkx':
+        G = graph_erdos(n_clusters, p['avgcl'], p['mc'], p['mi'], p['tests'], p['seed'])
+        graph_add_information(G, p['perc'], rng=p['seed'])
+        return G
+    C = csr_erdos(n_clusters, p['avgcl'], p['mc'], p['mi'], p['seed'])
+    C.information = coverage_information(C, [p['perc']], p['seed'])[p['perc']]
+    return C
+
+
+def bench_walk(p):
+    from csr_walking import ars_walk_csr, pagerank_walk_csr, random_walk_csr, walk_batch
+    from information import InformationState
+    from walk_kernels import walk_compiled
+    from walking import ars_walk, pagerank_walk, random_walk
+
+    graph = _walk_setup(p)
+    method, engine, steps, tau, n_tests = p['method'], p['engine'], p['steps'], p['tau'], p['tests']
+    rng = np.random.default_rng(p['seed'])
+    out = np.empty((n_tests, steps))
+
+    if engine == 'networkx':
+        state = graph.graph['information_state']
+        walk = {'random': random_walk, 'ars': ars_walk, 'pagerank': pagerank_walk}[method]
+        kwargs = {'tau': tau} if method == 'ars' else {}
+
+        def run():
+            for test in range(n_tests):
+                walk(graph, test, steps, state=state, rng=rng, out=out[test], **kwargs)
+    elif engine == 'csr':
+        state = None
+        walk = {'random': random_walk_csr, 'ars': ars_walk_csr, 'pagerank': pagerank_walk_csr}[method]
+        kwargs = {'tau': tau} if method == 'ars' else {}
+
+        def run():
+            for test in range(n_tests):
+                walk(graph, steps, rng=rng, out=out[test], **kwargs)
+    else:
+        state = InformationState(graph.information, n_tests)
+        walk = walk_batch if engine == 'batch' else walk_compiled
+
+        def run():
+            walk(graph, method, n_tests, steps, tau, state, rng, out)
+
+        if engine == 'compiled':
+            # compile (or load the cached kernels) before timing
+            walk(graph, method, 1, 10, 1, rng=rng)
+
+    wall = _best_time(run, p['repeat'], None if state is None else state.reset)
+    return {'wall': wall, 'steps_per_s': n_tests * steps / wall, 'information': float(out[:, -1].mean())}
+
+
+def _curve_results(p):
+    # random {perc: {tau: curve}} results of p['percs'] coverage levels
+    percs = [round((k + 1) / p['percs'], 2) for k in range(p['percs'])]
+    curves = np.cumsum(np.random.default_rng(p['seed']).random((len(percs), len(p['taus']), p['steps'])), axis=2)
+    return (len(percs), p['steps'], p['tests']), {perc: dict(zip(p['taus'], curves[k])) for k, perc in enumerate(percs)}
+
+
+@contextlib.contextmanager
+def _scratch_dir():
+    # run in a temporary working directory, for the files the plots write, and leave it afterwards
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as path:
+        os.chdir(path)
+        try:
+            yield path
+        finally:
+            os.chdir(cwd)
+
+
+def bench_plot_curves(p):
+    import matplotlib
+    matplotlib.use('Agg')
+    import plotter
+
+    simulation_parameters, results = _curve_results(p)
+    with _scratch_dir():
+        wall = _best_time(lambda: plotter.plot_ars_by_steps_to_jump_and_perc_cl_info(
+            simulation_parameters, results, p['taus']), p['repeat'])
+    return {'wall': wall}
+
+
+def bench_render_curves(p):
+    import matplotlib
+    matplotlib.use('Agg')
+    import plotter
+
+    simulation_parameters, results = _curve_results(p)
+    with _scratch_dir():
+        wall = _best_time(lambda: plotter.render_ars_results(simulation_parameters, results, p['taus']), p['repeat'])
+    return {'wall': wall}
+
+
+def bench_plot_stats(p):
+    import matplotlib
+    matplotlib.use('Agg')
+    import plotter
+
+    # the pyplot functions, with plotter.HEADLESS left off as in interactive use
+    curves = np.cumsum(np.random.default_rng(p['seed']).random((p['tests'], p['steps'])), axis=1)
+
+    def run():
+        plotter.plot_stats(curves, curves[:, -1].max(), 'random')
+        plotter.plt.close('all')
+
+    return {'wall': _best_time(run, p['repeat'])}
+
+
+def bench_plot_graph(p):
+    import matplotlib
+    matplotlib.use('Agg')
+    import plotter
+    from graph import graph_add_information, graph_erdos
+
+    n_clusters = _n_clusters(p['nodes'], p['avgcl'])
+    G = graph_erdos(n_clusters, p['avgcl'], p['mc'], p['mi'], p['tests'], p['seed'])
+    graph_add_information(G, p['perc'], rng=p['seed'])
+
+    def run():
+        plotter.plot_graph_colored_by_info(G, p['perc'])
+        plotter.plt.close('all')
+
+    # the first repeat computes the layout, the others read it from the cache
+    with _scratch_dir():
+        return {'wall': _best_time(run, p['repeat'])}
+
+
+CASES = {
+    'g_make': bench_g_make,
+    'g_make_edges': bench_g_make_edges,
+    'graph_erdos': bench_graph_erdos,
+    'graph_add_information': bench_graph_add_information,
+    'walk': bench_walk,
+    'plot_curves': bench_plot_curves,
+    'render_curves': bench_render_curves,
+    'plot_stats': bench_plot_stats,
+    'plot_graph': bench_plot_graph,
+}
+
+
+def _run_case(case, params):
+    result = CASES[case](params)
+    result['peak_rss_mb'] = _peak_rss_mb()
+    return result
+
+
+def run_case(case, params, isolate=True) -> dict:
+    """
+    Run one benchmark case, in a fresh process if isolate.
+
+    Returns:
+        dict: The case, its parameters and its measurements (wall time in seconds,
+        peak RSS in MB, steps per second for the walks).
+    """
+    if isolate:
+        # not a multiprocessing.Pool: its daemonic workers cannot start the pools of the cases
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as pool:
+            result = pool.submit(_run_case, case, params).result()
+    else:
+        result = _run_case(case, params)
+    return {'case': case, 'params': params, **result}
+
+
+def plan(args) -> list:
+    """
+    List the (case, params) pairs selected by the command line arguments.
+    """
+    base = {'avgcl': args.avgcl, 'mc': args.mc, 'mi': args.mi, 'perc': args.perc, 'seed': args.seed,
+            'repeat': args.repeat}
+    cases = []
+    for nodes in args.nodes:
+        legacy = nodes <= args.legacy_limit
+        for case in ('g_make', 'graph_erdos', 'graph_add_information'):
+            if legacy and case in args.cases:
+                cases.append((case, {**base, 'nodes': nodes, 'tests': max(args.tests)}))
+        if 'g_make_edges' in args.cases:
+            cases.append(('g_make_edges', {**base, 'nodes': nodes}))
+        if 'plot_graph' in args.cases and nodes <= args.layout_limit:
+            cases.append(('plot_graph', {**base, 'nodes': nodes, 'tests': 1}))
+
+        if 'walk' not in args.cases:
+            continue
+        for engine in args.engines:
+            if engine == 'networkx' and not legacy:
+                continue
+            for method in args.methods:
+                for tau in (args.taus if method == 'ars' else [None]):
+                    for tests in args.tests:
+                        cases.append(('walk', {**base, 'nodes': nodes, 'engine': engine, 'method': method,
+                                               'tau': tau, 'tests': tests, 'steps': args.steps}))
+
+    if 'plot_stats' in args.cases:
+        cases.append(('plot_stats', {**base, 'steps': args.steps, 'tests': max(args.tests)}))
+    for case in ('plot_curves', 'render_curves'):
+        if case in args.cases:
+            cases.append((case, {**base, 'percs': args.percs, 'taus': args.taus, 'steps': args.steps,
+                                 'tests': max(args.tests)}))
+    return cases
+
+
+def _key(result):
+    return json.dumps([result['case'], result['params']], sort_keys=True)
+
+
+def compare(results, baseline, threshold) -> list:
+    """
+    Cases of results whose wall time exceeds the baseline's by more than threshold (a fraction).
+
+    Returns:
+        list: (result, baseline wall time) of each regression.
+    """
+    previous = {_key(result): result['wall'] for result in baseline}
+    return [(result, previous[_key(result)]) for result in results
+            if _key(result) in previous and result['wall'] > previous[_key(result)] * (1 + threshold)]
+
+
+def _describe(result):
+    p = result['params']
+    if result['case'] == 'walk':
+        tau = f" tau={p['tau']}" if p['tau'] is not None else ''
+        return f"walk {p['engine']} {p['method']}{tau} tests={p['tests']} steps={p['steps']} nodes={p['nodes']}"
+    if result['case'] == 'plot_stats':
+        return f"plot_stats tests={p['tests']} steps={p['steps']}"
+    if result['case'] in ('plot_curves', 'render_curves'):
+        return f"{result['case']} percs={p['percs']} taus={len(p['taus'])} steps={p['steps']}"
+    return f"{result['case']} nodes={p['nodes']}"
+
+
+def print_table(results):
+    print(f"{'case':<70} {'wall (s)':>10} {'RSS (MB)':>10} {'steps/s':>12}")
+    for result in results:
+        steps_per_s = f"{result['steps_per_s']:.3g}" if 'steps_per_s' in result else ''
+        print(f"{_describe(result):<70} {result['wall']:>10.4f} {result['peak_rss_mb']:>10.1f} {steps_per_s:>12}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark graph generation, walks and plotting.')
+    parser.add_argument('--cases', nargs='+', default=list(CASES), choices=list(CASES))
+    parser.add_argument('--nodes', nargs='+', type=int, default=[100, 1000, 10000],
+                        help='graph sizes in nodes (up to 1000000)')
+    parser.add_argument('--avgcl', type=int, default=20, help='average cluster size')
+    parser.add_argument('--mc', type=int, default=5, help='edges per node inside a cluster')
+    parser.add_argument('--mi', type=int, default=2, help='edges per cluster between clusters')
+    parser.add_argument('--perc', type=float, default=0.5, help='fraction of clusters with information')
+    parser.add_argument('--engines', nargs='+', default=list(ENGINES), choices=ENGINES)
+    parser.add_argument('--methods', nargs='+', default=list(METHODS), choices=METHODS)
+    parser.add_argument('--taus', nargs='+', type=int, default=[5])
+    parser.add_argument('--tests', nargs='+', type=int, default=[100])
+    parser.add_argument('--steps', type=int, default=1000)
+    parser.add_argument('--percs', type=int, default=4, help='coverage levels of plot_curves and render_curves')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--legacy-limit', type=int, default=100000,
+                        help='largest graph for g_make and the networkx cases')
+    parser.add_argument('--layout-limit', type=int, default=100000, help='largest graph for plot_graph')
+    parser.add_argument('--no-isolate', action='store_true', help='run every case in this process')
+    parser.add_argument('--output', help='save the results to this JSON file')
+    parser.add_argument('--compare', help='JSON file of a previous run to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown, as a fraction')
+    args = parser.parse_args(argv)
+
+    results = []
+    for case, params in plan(args):
+        result = run_case(case, params, not args.no_isolate)
+        results.append(result)
+        print(f"{_describe(result)}: {result['wall']:.4f}s", flush=True)
+
+    print()
+    print_table(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for result, previous in regressions:
+            print(f"REGRESSION {_describe(result)}: {result['wall']:.4f}s vs {previous:.4f}s")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,10 +5,17 @@
 #
 #
 import sys
-import random
+
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+from cluster_index import ClusterIndex
+from instrumentation import timed
+from seeding import make_rng
 
 #
-#  g = erdos_make(n, m, c)
+#  g = erdos_make(n, m, c, rng)
 #  
 #
 # Builds an Erdos graph given the number of nodes, the average degree
@@ -20,6 +27,7 @@ import random
 # n:   number of nodes in the graph
 # m:   average degree of a node of the graph
 # c:   cluster number to be assigned to the nodes of the graph
+# rng: random generator, seed or None (see seeding.make_rng)
 #
 # Returns: a list of pair:
 #
@@ -34,16 +42,17 @@ import random
 #  for small m. If a connected graph is needed, some additional
 #  measures must be taken
 #
-def erdos_make(n, m, c):
+def erdos_make(n, m, c, rng=None):
+    rng = make_rng(rng)
     adj = [[] for _ in range(n)]
     edgeno = n*m
     for _ in range(edgeno):
-        src = random.randint(0,n-1)
-        dst = random.randint(0,n-1)
+        src = int(rng.integers(n))
+        dst = int(rng.integers(n))
         w = 0
         while (src == dst) or (dst in adj[src]):
-            src = random.randint(0,n-1)
-            dst = random.randint(0,n-1)
+            src = int(rng.integers(n))
+            dst = int(rng.integers(n))
             w += 1
             if w > 10000:     # Too many attempts. Give up
                 return [[c, a] for a in adj]
@@ -76,7 +85,7 @@ def g_join(g1, g2):
 
 
 #
-#  g = g_clst_edge(g, clst, c1, c2)
+#  g = g_clst_edge(g, clst, c1, c2, rng)
 #
 #  Creates an edge between a random node of cluster c1 and a random
 #  node of cluster c2
@@ -88,18 +97,20 @@ def g_join(g1, g2):
 #        in the range clst[k][0] to clst[k][1]
 #  c1:   first cluster to be joined
 #  c2:   second cluster to be joined
+#  rng:  random generator, seed or None (see seeding.make_rng)
 #
 #  Returns:
 #    the graph g with the edge added (the parameter is changed: this
 #    is not a copy)
 #
-def g_clst_edge(g, clst, c1, c2):
-    src = random.randint(clst[c1][0],clst[c1][1]-1)
-    dst = random.randint(clst[c2][0],clst[c2][1]-1)
+def g_clst_edge(g, clst, c1, c2, rng=None):
+    rng = make_rng(rng)
+    src = int(rng.integers(clst[c1][0], clst[c1][1]))
+    dst = int(rng.integers(clst[c2][0], clst[c2][1]))
     w = 0
     while (src == dst) or (dst in g[src][1]):
-        src = random.randint(clst[c1][0],clst[c1][1]-1)
-        dst = random.randint(clst[c2][0],clst[c2][1]-1)
+        src = int(rng.integers(clst[c1][0], clst[c1][1]))
+        dst = int(rng.integers(clst[c2][0], clst[c2][1]))
         
         w += 1
         if w > 10000:     # Too many attempts. Give up
@@ -112,24 +123,28 @@ def g_clst_edge(g, clst, c1, c2):
     
 
 #
-#  Disjoint set structure. Creates a new one with n sets
+#  Disjoint set structure. Creates a new one with n sets. The
+#  structure is an integer array: ds[k] is the parent of k, or minus
+#  the size of the set if k is a representative
 #
 def ds_make(n):
-    return n*[-1]
+    return np.full(n, -1, dtype=np.int64)
 
 #
 #  Finds the representative of an element
-#  (no path compression)
+#  (path halving: every visited element is linked to its grandparent)
 #
 def ds_find(ds, n):
     while ds[n] >= 0:
+        if ds[ds[n]] >= 0:
+            ds[n] = ds[ds[n]]
         n = ds[n]
-    return n
+    return int(n)
 
 
 #
 # Union of the sets representatives of two element. Returns the
-# representative of the union
+# representative of the union (the one of the larger set)
 #
 def ds_union(ds, a, b):
     x = ds_find(ds, a)
@@ -137,15 +152,39 @@ def ds_union(ds, a, b):
     if x == y:
         return x
     if ds[y] < ds[x]:
-        ds[x] = y
-        return y
-    elif ds[x] < ds[y]:
-        ds[y] = x
-        return x
-    else:
-        ds[y] = x
-        ds[x] -= 1
-        return x
+        x, y = y, x
+    ds[x] += ds[y]
+    ds[y] = x
+    return x
+
+
+#
+# Union of the sets of the two ends of each edge of an (n_edges, 2)
+# array. Same as calling ds_union for each edge, but the loop runs on
+# a plain list, which is much faster than element access on the array
+#
+def ds_union_edges(ds, edges):
+    parent = ds.tolist()
+
+    def find(n):
+        while parent[n] >= 0:
+            if parent[parent[n]] >= 0:
+                parent[n] = parent[parent[n]]
+            n = parent[n]
+        return n
+
+    for a, b in np.asarray(edges).reshape(-1, 2).tolist():
+        x = find(a)
+        y = find(b)
+        if x == y:
+            continue
+        if parent[y] < parent[x]:
+            x, y = y, x
+        parent[x] += parent[y]
+        parent[y] = x
+
+    ds[:] = parent
+    return ds
 
 
 #
@@ -164,20 +203,17 @@ def ds_union(ds, a, b):
 #
 def g_fix(g):
     ds = ds_make(len(g))
-    for u in range(len(g)):
-        for v in g[u][1]:
-            ds_union(ds, u, v)
+    ds_union_edges(ds, [(u, v) for u in range(len(g)) for v in g[u][1]])
     p = -1
     c = -1
-    for k in range(len(ds)):
-        if ds[k] < 0:
-            if c < 0:
-                c = k
-            else:
-                p = c
-                c = k
-                g[p][1] += [c]
-                g[c][1] += [p]
+    for k in np.flatnonzero(ds < 0).tolist():
+        if c < 0:
+            c = k
+        else:
+            p = c
+            c = k
+            g[p][1] += [c]
+            g[c][1] += [p]
     return g
 
 
@@ -201,6 +237,7 @@ def g_fix(g):
 #    clave    average sze of each cluster
 #    mc       average degree of the nodes of a cluster
 #    mi       average degree between clusters
+#    rng      random generator, seed or None (see seeding.make_rng)
 #
 #  Returns
 #
@@ -213,7 +250,12 @@ def g_fix(g):
 #  implicitly by its position on the list (element g[k] is the element
 #  of the node with identifier k)
 #
-def g_make(cno, clave, mc, mi):
+#  With return_index, the pair (g, index), index being the cluster
+#  index built by g_index
+#
+@timed('g_make')
+def g_make(cno, clave, mc, mi, rng=None, return_index=False):
+    rng = make_rng(rng)
     clst = [[] for _ in range(cno)]   # List of pairs (a,b): nodes of cluster k are in the range clst[k][0] to clst[k][1]
     clst[-1] = [0,0]                  # This is  a trick to initialize properly the element 0 in the loop
     #                                                                                                  |
@@ -222,10 +264,10 @@ def g_make(cno, clave, mc, mi):
     #  Erdos graph (with correction)                                                                   |
     g = []                                                       #                                     |
     for cq in range(cno):                                        #                                     |
-        size = 2 + int(random.expovariate(1.0/float(clave)))     #                                     V
+        size = 2 + int(rng.exponential(float(clave)))            #                                     V
         clst[cq] = [clst[cq-1][1], clst[cq-1][1]+size]     #  See? When cq=0 and cq-1=-1 I use the trick above
         # print(clst[cq])
-        g1 = erdos_make(size, mc, cq)
+        g1 = erdos_make(size, mc, cq, rng)
         g_fix(g1)
         g = g_join(g, g1)
 
@@ -233,27 +275,207 @@ def g_make(cno, clave, mc, mi):
     # using a disjoint sets structure
     clds = ds_make(cno)
     nedge = cno*mi
+    cl_pairs = []
 
     for k in range(nedge):
-        cl1 = random.randint(0,cno-1)
-        cl2 = random.randint(0,cno-1)
-        g_clst_edge(g, clst, cl1, cl2)       
-        ds_union(clds, cl1, cl2)
+        cl1 = int(rng.integers(cno))
+        cl2 = int(rng.integers(cno))
+        g_clst_edge(g, clst, cl1, cl2, rng)  
+        cl_pairs.append((cl1, cl2))
+    ds_union_edges(clds, cl_pairs)
 
     # Now connect with an edge the parts that have remained disconnected
     p = -1
     c = -1
-    for k in range(len(clds)):
-        if clds[k] < 0:
-            if c < 0:
-                c = k
-            else:
-                p = c
-                c = k
-                g_clst_edge(g, clst, p, c)       
+    for k in np.flatnonzero(clds < 0).tolist():
+        if c < 0:
+            c = k
+        else:
+            p = c
+            c = k
+            g_clst_edge(g, clst, p, c, rng)  
+
+    if return_index:
+        return g, g_index(g, clst)
     return g
 
 
+#
+#  Cluster index of a graph built by g_make: the node ranges clst of
+#  its clusters and the edges that join different clusters (see
+#  cluster_index.ClusterIndex)
+#
+def g_index(g, clst):
+    offsets = [r[0] for r in clst] + [clst[-1][1]]
+    inter = [(k, j) for k, (c, adj) in enumerate(g) for j in adj if k < j and g[j][0] != c]
+    return ClusterIndex(offsets, inter)
+
+
+
+#
+#  Vectorized version of g_make. Instead of the list of adjacency lists
+#  it builds the edge array directly, sampling all the edges of a
+#  round at once with NumPy and removing duplicates by hashing each
+#  edge (a, b), a < b, to the integer a*n + b.
+#
+#  The distribution is the one of g_make: exponential cluster sizes
+#  (minimum 2), n*mc distinct random edges inside each cluster of n
+#  nodes (or the complete graph, if it has fewer edges), a chain of
+#  edges joining the components of each cluster, cno*mi edges
+#  between random nodes of random pairs of clusters, and a chain of
+#  edges joining the groups of clusters that remained disconnected.
+#
+#  Parameters
+#
+#    cno      Number of clusters
+#    clave    average sze of each cluster
+#    mc       average degree of the nodes of a cluster
+#    mi       average degree between clusters
+#    rng      random generator, seed or None (see seeding.make_rng)
+#
+#  Returns
+#
+#    (edges, clusters): edges is an (n_edges, 2) integer array with
+#    each undirected edge once (smaller index first) and clusters is
+#    the array with the cluster number of each node. The nodes of
+#    cluster k are consecutive, as in g_make. With return_index, the
+#    cluster index (ClusterIndex) is returned as a third element.
+#
+
+
+#
+#  Splits a pair index 0 <= p < n*(n-1)/2 into the pair (a, b), a < b,
+#  listing the pairs as (0,1), (0,2), ..., (0,n-1), (1,2), ...
+#
+def pair_decode(p, n):
+    a = n - 2 - np.floor(np.sqrt(-8*p + 4*n*(n-1) - 7)/2.0 - 0.5).astype(np.int64)
+    b = p + a + 1 - n*(n-1)//2 + (n-a)*((n-a)-1)//2
+    return a, b
+
+
+#
+#  Membership of the keys in a sorted array of keys
+#
+def _in_sorted(keys, sorted_keys):
+    if len(sorted_keys) == 0:
+        return np.zeros(len(keys), dtype=bool)
+    pos = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys)-1)
+    return sorted_keys[pos] == keys
+
+
+#
+#  Draws the edges of each cluster: target[k] distinct edges between
+#  the nodes start[k] .. start[k]+size[k]-1. Returns the edge keys
+#  a*n + b
+#
+def _intra_edges(start, size, target, n, rng):
+    pairs = size*(size-1)//2
+    keys = []
+
+    # Clusters that need more than half of their pairs are drawn
+    # directly as a random subset of the pairs (rejection would keep
+    # hitting existing edges)
+    dense = np.flatnonzero(2*target > pairs)
+    for k in dense:
+        p = rng.choice(pairs[k], target[k], replace=False)
+        a, b = pair_decode(p, size[k])
+        keys.append((start[k] + a)*n + start[k] + b)
+
+    need = target.copy()
+    need[dense] = 0
+    accepted = np.empty(0, dtype=np.int64)
+    while need.sum() > 0:
+        cl = np.repeat(np.arange(len(need)), need + need//4 + 1)
+        a = start[cl] + (rng.random(len(cl))*size[cl]).astype(np.int64)
+        b = start[cl] + (rng.random(len(cl))*size[cl]).astype(np.int64)
+        ok = a != b
+        cl, key = cl[ok], np.minimum(a, b)[ok]*n + np.maximum(a, b)[ok]
+
+        # first occurrence of each new edge, in order of drawing
+        _, first = np.unique(key, return_index=True)
+        first.sort()
+        cl, key = cl[first], key[first]
+        fresh = ~_in_sorted(key, accepted)
+        cl, key = cl[fresh], key[fresh]
+
+        # keep at most need[k] of them for cluster k
+        order = np.argsort(cl, kind='stable')
+        cl, key = cl[order], key[order]
+        rank = np.arange(len(cl)) - np.searchsorted(cl, cl)
+        keep = rank < need[cl]
+        accepted = np.sort(np.concatenate((accepted, key[keep])))
+        need -= np.bincount(cl[keep], minlength=len(need))
+
+    keys.append(accepted)
+    return np.concatenate(keys)
+
+
+#
+#  Edges that chain the connected components of a graph, restricted
+#  to components with the same group label (node clusters, or all 0).
+#  Each component is represented by its smallest node
+#
+def _component_chain(keys, n, group):
+    a, b = keys//n, keys % n
+    adj = coo_matrix((np.ones(len(keys), dtype=np.int8), (a, b)), shape=(n, n))
+    _, labels = connected_components(adj, directed=False)
+    _, reps = np.unique(labels, return_index=True)
+    reps.sort()
+    same = group[reps[1:]] == group[reps[:-1]]
+    return reps[:-1][same], reps[1:][same]
+
+
+@timed('g_make_edges')
+def g_make_edges(cno, clave, mc, mi, rng=None, return_index=False):
+    rng = make_rng(rng)
+
+    size = 2 + rng.exponential(float(clave), cno).astype(np.int64)
+    start = np.concatenate(([0], np.cumsum(size)[:-1]))
+    n = int(size.sum())
+    clusters = np.repeat(np.arange(cno), size)
+
+    # Clusters: Erdos graphs, with components chained together
+    target = np.minimum(size*mc, size*(size-1)//2)
+    keys = _intra_edges(start, size, target, n, rng)
+    p, c = _component_chain(keys, n, clusters)
+    keys = np.concatenate((keys, p*n + c))
+
+    # Thread the clusters with cno*mi edges between random clusters.
+    # Pairs that hit an existing edge (or the same node) redraw their
+    # nodes; after too many attempts the edge is given up, as in
+    # g_clst_edge
+    cl1 = rng.integers(0, cno, cno*mi)
+    cl2 = rng.integers(0, cno, cno*mi)
+    pending = np.arange(cno*mi)
+    intra = np.sort(keys)
+    inter = np.empty(0, dtype=np.int64)
+    for _ in range(100):
+        if len(pending) == 0:
+            break
+        src = start[cl1[pending]] + (rng.random(len(pending))*size[cl1[pending]]).astype(np.int64)
+        dst = start[cl2[pending]] + (rng.random(len(pending))*size[cl2[pending]]).astype(np.int64)
+        key = np.minimum(src, dst)*n + np.maximum(src, dst)
+        _, first = np.unique(key, return_index=True)
+        ok = np.zeros(len(pending), dtype=bool)
+        ok[first] = True
+        ok &= (src != dst) & ~_in_sorted(key, intra) & ~_in_sorted(key, inter)
+        inter = np.sort(np.concatenate((inter, key[ok])))
+        pending = pending[~ok]
+    keys = np.concatenate((keys, inter))
+
+    # Join the groups of clusters that remained disconnected, with an
+    # edge between random nodes of consecutive groups
+    p, c = _component_chain(cl1*cno + cl2, cno, np.zeros(cno, dtype=np.int64))
+    src = start[p] + (rng.random(len(p))*size[p]).astype(np.int64)
+    dst = start[c] + (rng.random(len(c))*size[c]).astype(np.int64)
+    keys = np.concatenate((keys, src*n + dst))
+
+    edges = np.stack((keys//n, keys % n), axis=1)
+    if return_index:
+        inter = edges[clusters[edges[:, 0]] != clusters[edges[:, 1]]]
+        return edges, clusters, ClusterIndex(np.append(start, n), inter)
+    return edges, clusters
+
 
 #
 #  Testing script
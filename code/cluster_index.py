@@ -0,0 +1,97 @@
+import numpy as np
+
+from csr_graph import csr_from_edges
+
+
+class ClusterIndex:
+    """
+    Cluster structure of a graph whose clusters are ranges of consecutive
+    nodes, as built by g_make and g_make_edges. It is the only record of which
+    node belongs to which cluster: graphs keep it in G.graph['cluster_index']
+    and CSRGraph.cluster_index, and the per-node labels and ranges derive from it.
+
+    A cluster is named by its label, the 'cluster' attribute of its nodes
+    (0..n_clusters-1 for graph_erdos, 1..n_clusters for graph_with_clusters).
+    Labels increase with the nodes, and the arrays with one value per cluster
+    (sizes, reduce, the nodes of adjacency) follow the order of labels.
+
+    Attributes:
+        offsets (np.ndarray): Node offsets, the k-th cluster is nodes offsets[k]:offsets[k + 1].
+        labels (np.ndarray): Label of the k-th cluster.
+        sizes (np.ndarray): Number of nodes of each cluster.
+        inter_edges (np.ndarray): (n_inter_edges, 2) edges between nodes of different clusters.
+        adjacency (CSRGraph): Cluster graph, the k-th and l-th clusters are neighbours when
+            an inter-cluster edge joins them.
+    """
+
+    def __init__(self, offsets, inter_edges, labels=None):
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.labels = np.arange(len(self.offsets) - 1) if labels is None else np.asarray(labels, dtype=np.int64)
+        self.sizes = np.diff(self.offsets)
+        self.inter_edges = np.asarray(inter_edges, dtype=np.int64).reshape(-1, 2)
+        if np.any(np.diff(self.labels) <= 0):
+            raise Exception("the cluster labels must increase with the nodes")
+
+        pairs = np.sort(self._position(self.inter_edges), axis=1)
+        self.adjacency = csr_from_edges(self.n_clusters, np.unique(pairs, axis=0))
+        self._ranges = None
+
+    @classmethod
+    def from_edges(cls, edges, clusters):
+        """
+        Build the index of an edge array and the cluster label of each node.
+
+        Args:
+            edges (array-like): (n_edges, 2) array of node pairs.
+            clusters (array-like): Cluster label of each node, increasing, each cluster in a range of nodes.
+        """
+        clusters = np.asarray(clusters, dtype=np.int64)
+        if np.any(np.diff(clusters) < 0):
+            raise Exception("the nodes of each cluster must be consecutive")
+        labels, starts = np.unique(clusters, return_index=True)
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        return cls(np.append(starts, len(clusters)), edges[clusters[edges[:, 0]] != clusters[edges[:, 1]]], labels)
+
+    @property
+    def n_clusters(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def n_nodes(self) -> int:
+        return int(self.offsets[-1])
+
+    def _position(self, nodes):
+        # position k of the cluster of each node
+        return np.searchsorted(self.offsets, nodes, side='right') - 1
+
+    def nodes(self, label) -> range:
+        return self.ranges()[label]
+
+    def cluster_of(self, nodes):
+        """
+        Label of the cluster of each node of nodes (an int or an array).
+        """
+        return self.labels[self._position(nodes)]
+
+    def node_labels(self) -> np.ndarray:
+        """
+        Cluster label of each node.
+        """
+        return np.repeat(self.labels, self.sizes)
+
+    def ranges(self) -> dict:
+        """
+        {label: range of its nodes}, in increasing label order.
+        """
+        if self._ranges is None:
+            self._ranges = {label: range(start, stop) for label, start, stop in
+                            zip(self.labels.tolist(), self.offsets[:-1].tolist(), self.offsets[1:].tolist())}
+        return self._ranges
+
+    def reduce(self, values, ufunc=np.add) -> np.ndarray:
+        """
+        Per-cluster reduction (a sum by default) of one value per node, in the
+        order of labels. Every cluster must have at least one node, as the ones
+        of g_make do.
+        """
+        return ufunc.reduceat(np.asarray(values), self.offsets[:-1])
@@ -0,0 +1,138 @@
+import hashlib
+
+import networkx as nx
+import numpy as np
+
+from instrumentation import timed
+
+
+class CSRGraph:
+    """
+    Compiled, array-backed form of a graph built by graph_erdos or graph_with_clusters.
+
+    Nodes are relabelled to the integers 0..n_nodes-1 following the order of G.nodes,
+    and the neighbours of node k are indices[offsets[k]:offsets[k + 1]]. Self loops are
+    dropped, so a walker never "moves" to the node it is standing on.
+
+    Attributes:
+        offsets (np.ndarray): Row offsets, length n_nodes + 1.
+        indices (np.ndarray): Concatenated neighbour lists.
+        information (np.ndarray): Information held by each node (float64).
+        cluster_index (ClusterIndex): Clusters of the graph, or None if unknown.
+        nodes (list | range): Original node ids, nodes[k] is the id of node k.
+    """
+
+    def __init__(self, offsets, indices, information=None, cluster_index=None, nodes=None):
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        n_nodes = len(self.offsets) - 1
+
+        if information is None:
+            information = np.zeros(n_nodes)
+        self.information = np.asarray(information, dtype=np.float64)
+        self.cluster_index = cluster_index
+        self.nodes = range(n_nodes) if nodes is None else list(nodes)
+
+        if len(self.information) != n_nodes:
+            raise Exception("information must have one value per node")
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def n_edges(self) -> int:
+        return len(self.indices) // 2
+
+    @property
+    def clusters(self) -> np.ndarray:
+        # cluster label of each node, or None if unknown
+        return None if self.cluster_index is None else self.cluster_index.node_labels()
+
+    @property
+    def degrees(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    @property
+    def total_information(self) -> float:
+        return float(self.information.sum())
+
+    def neighbors(self, node) -> np.ndarray:
+        return self.indices[self.offsets[node]:self.offsets[node + 1]]
+
+
+def csr_from_edges(n_nodes, edges, information=None, cluster_index=None, nodes=None) -> CSRGraph:
+    """
+    Build a CSRGraph from an undirected edge array.
+
+    Args:
+        n_nodes (int): Number of nodes in the graph.
+        edges (array-like): (n_edges, 2) array of node index pairs, each undirected edge once.
+        information (array-like): Information of each node (defaults to zeros).
+        cluster_index (ClusterIndex): Clusters of the graph.
+        nodes (list): Original node ids.
+
+    Returns:
+        CSRGraph: The compiled graph.
+    """
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    edges = edges[edges[:, 0] != edges[:, 1]]
+
+    src = np.concatenate((edges[:, 0], edges[:, 1]))
+    dst = np.concatenate((edges[:, 1], edges[:, 0]))
+    order = np.argsort(src, kind='stable')
+
+    offsets = np.zeros(n_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n_nodes), out=offsets[1:])
+
+    return CSRGraph(offsets, dst[order], information, cluster_index, nodes)
+
+
+@timed('csr_from_graph')
+def csr_from_graph(G: nx.Graph, test_index=0) -> CSRGraph:
+    """
+    Compile a networkx graph into a CSRGraph.
+
+    Args:
+        G (nx.Graph): Graph built by graph_erdos or graph_with_clusters.
+        test_index (int): Which test slot of the 'information' attribute to read.
+
+    Returns:
+        CSRGraph: The compiled graph, with the cluster index of G if its nodes have
+        clusters. G is not modified.
+    """
+    from cluster_index import ClusterIndex     # cluster_index builds its cluster graph with this module
+
+    nodes = list(G.nodes)
+    index = {node: k for k, node in enumerate(nodes)}
+
+    edges = np.array([(index[u], index[v]) for u, v in G.edges], dtype=np.int64)
+
+    information = np.zeros(len(nodes))
+    clusters = np.zeros(len(nodes), dtype=np.int64)
+    has_clusters = True
+    for k, node in enumerate(nodes):
+        attributes = G.nodes[node]
+        if 'information' in attributes:
+            information[k] = attributes['information'][test_index]
+        if 'cluster' in attributes:
+            clusters[k] = attributes['cluster']
+        else:
+            has_clusters = False
+
+    cluster_index = G.graph.get('cluster_index')
+    if cluster_index is None and has_clusters:
+        cluster_index = ClusterIndex.from_edges(edges, clusters)
+    return csr_from_edges(len(nodes), edges, information, cluster_index, nodes)
+
+
+def graph_hash(G) -> str:
+    """
+    Hash of the structure of a graph (edges and cluster labels, in G.nodes order).
+    """
+    C = csr_from_graph(G) if isinstance(G, nx.Graph) else G
+    digest = hashlib.sha1()
+    for array in (C.offsets, C.indices, C.clusters):
+        if array is not None:
+            digest.update(np.ascontiguousarray(array, dtype=np.int64).tobytes())
+    return digest.hexdigest()
@@ -0,0 +1,299 @@
+import numpy as np
+
+from csr_graph import CSRGraph
+from information import InformationState
+from instrumentation import count, recording, timed
+from sampling import csr_neighbor, csr_neighbors, other_index, other_indices
+from seeding import make_rng
+from stats import RunStats
+from walking import PAGERANK_PROB
+
+#
+#   Walks on a CSRGraph. They follow the same rules as the walks in walking.py
+#   (which remain the reference implementation), but every step is O(1): the
+#   neighbours of a node are a slice of the CSR arrays and a uniform node is
+#   drawn by index instead of materialising list(G.nodes).
+#
+#   Every walk starts at node 0 and returns the cumulative information after
+#   each step. The information array is consumed in place: pass the same array
+#   to several walks to share the depletion, or leave it as None to start from
+#   a fresh copy of C.information. rng may be a Generator or a seed (see
+#   seeding.make_rng). The curve is written into out when a preallocated
+#   array is given. Steps, jumps, resets and teleports are reported to
+#   instrumentation, like the walks of walking.py.
+#
+
+
+@timed('walk.random')
+def random_walk_csr(C: CSRGraph, steps=10, information=None, rng=None, out=None) -> np.ndarray:
+    rng = make_rng(rng)
+    info = C.information.copy() if information is None else information
+    offsets, indices, n_nodes = C.offsets, C.indices, C.n_nodes
+
+    draws = rng.random(steps)
+    info_steps = np.empty(steps) if out is None else out
+    current_node = 0
+    actual_info = 0.0
+    teleports = 0
+
+    for i in range(steps):
+        next_hop = csr_neighbor(offsets, indices, current_node, draws[i])
+        if next_hop < 0:
+            next_hop = other_index(n_nodes, current_node, draws[i])
+            teleports += 1
+        current_node = next_hop
+        actual_info += info[current_node]
+        info_steps[i] = actual_info
+        info[current_node] = 0
+
+    count('steps', steps)
+    count('teleports', teleports)
+    return info_steps
+
+
+@timed('walk.ars')
+def ars_walk_csr(C: CSRGraph, steps=10, tau=5, information=None, rng=None, out=None) -> np.ndarray:
+    if tau > steps:
+        raise Exception("tau must be less than steps")
+
+    rng = make_rng(rng)
+    info = C.information.copy() if information is None else information
+    offsets, indices, n_nodes = C.offsets, C.indices, C.n_nodes
+
+    draws = rng.random(steps)
+    info_steps = np.empty(steps) if out is None else out
+    current_node = 0
+    actual_info = 0.0
+    t = 0
+    jumps = resets = 0
+
+    for i in range(steps):
+        next_hop = -1 if t >= tau else csr_neighbor(offsets, indices, current_node, draws[i])
+        if next_hop < 0:
+            next_hop = int(draws[i] * n_nodes)
+            jumps += 1
+        current_node = next_hop
+
+        info_to_add = info[current_node]
+
+        if info_to_add > 0:
+            t = 0
+            resets += 1
+        else:
+            t += 1
+
+        actual_info += info_to_add
+        info_steps[i] = actual_info
+        info[current_node] = 0
+
+    count('steps', steps)
+    count('jumps', jumps)
+    count('resets', resets)
+    return info_steps
+
+
+@timed('walk.pagerank')
+def pagerank_walk_csr(C: CSRGraph, steps=10, information=None, rng=None, out=None) -> np.ndarray:
+    rng = make_rng(rng)
+    info = C.information.copy() if information is None else information
+    offsets, indices, n_nodes = C.offsets, C.indices, C.n_nodes
+
+    coin_flips = rng.random(steps)
+    draws = rng.random(steps)
+    info_steps = np.empty(steps) if out is None else out
+    current_node = 0
+    actual_info = 0.0
+    teleports = 0
+
+    for i in range(steps):
+        next_hop = -1 if coin_flips[i] < PAGERANK_PROB else csr_neighbor(offsets, indices, current_node, draws[i])
+        if next_hop < 0:
+            next_hop = other_index(n_nodes, current_node, draws[i])
+            teleports += 1
+        current_node = next_hop
+        actual_info += info[current_node]
+        info_steps[i] = actual_info
+        info[current_node] = 0
+
+    count('steps', steps)
+    count('teleports', teleports)
+    return info_steps
+
+
+#
+#   Batched walks: n_walkers independent walkers advance in lockstep, one
+#   vectorized NumPy step for all of them. Walker k depletes row k of an
+#   (n_walkers, n_nodes) information matrix, the equivalent of the test_index
+#   slots of walking.py, or walker k of an InformationState, which can be
+#   reset between runs instead of rebuilding the matrix. Row k of the result
+#   is the info_steps curve of walker k. The jumps, resets and teleports are
+#   only counted while an instrumentation run is open.
+#
+
+
+def _batch_take(C: CSRGraph, n_walkers, information):
+    # returns take(nodes): the information collected by walker k at nodes[k]
+    if isinstance(information, InformationState):
+        if information.n_walkers != n_walkers:
+            raise Exception("the information state must have n_walkers walkers")
+        return information.take_batch
+
+    if information is None:
+        information = np.tile(C.information, (n_walkers, 1))
+    elif information.shape != (n_walkers, C.n_nodes):
+        raise Exception("information must have shape (n_walkers, n_nodes)")
+    walkers = np.arange(n_walkers)
+
+    def take(nodes):
+        info = information[walkers, nodes]
+        information[walkers, nodes] = 0
+        return info
+
+    return take
+
+
+@timed('walk_batch.random')
+def random_walk_batch(C: CSRGraph, n_walkers, steps=10, information=None, rng=None, out=None) -> np.ndarray:
+    rng = make_rng(rng)
+    take = _batch_take(C, n_walkers, information)
+    counting = recording()
+    teleports = 0
+
+    current_nodes = np.zeros(n_walkers, dtype=np.int64)
+    actual_info = np.zeros(n_walkers)
+    info_steps = np.empty((n_walkers, steps)) if out is None else out
+
+    for i in range(steps):
+        draws = rng.random(n_walkers)
+        neighbors, isolated = csr_neighbors(C.offsets, C.indices, current_nodes, draws)
+        current_nodes = np.where(isolated, other_indices(C.n_nodes, current_nodes, draws), neighbors)
+        actual_info += take(current_nodes)
+        info_steps[:, i] = actual_info
+        if counting:
+            teleports += np.count_nonzero(isolated)
+
+    count('steps', n_walkers * steps)
+    count('teleports', teleports)
+    return info_steps
+
+
+@timed('walk_batch.ars')
+def ars_walk_batch(C: CSRGraph, n_walkers, steps=10, tau=5, information=None, rng=None, out=None) -> np.ndarray:
+    if tau > steps:
+        raise Exception("tau must be less than steps")
+
+    rng = make_rng(rng)
+    take = _batch_take(C, n_walkers, information)
+
+    current_nodes = np.zeros(n_walkers, dtype=np.int64)
+    actual_info = np.zeros(n_walkers)
+    info_steps = np.empty((n_walkers, steps)) if out is None else out
+    t = np.zeros(n_walkers, dtype=np.int64)
+    counting = recording()
+    jumps = resets = 0
+
+    for i in range(steps):
+        draws = rng.random(n_walkers)
+        neighbors, isolated = csr_neighbors(C.offsets, C.indices, current_nodes, draws)
+        jump = (t >= tau) | isolated
+        current_nodes = np.where(jump, (draws * C.n_nodes).astype(np.int64), neighbors)
+
+        info_to_add = take(current_nodes)
+        t = np.where(info_to_add > 0, 0, t + 1)
+
+        actual_info += info_to_add
+        info_steps[:, i] = actual_info
+        if counting:
+            jumps += np.count_nonzero(jump)
+            resets += np.count_nonzero(info_to_add > 0)
+
+    count('steps', n_walkers * steps)
+    count('jumps', jumps)
+    count('resets', resets)
+    return info_steps
+
+
+@timed('walk_batch.pagerank')
+def pagerank_walk_batch(C: CSRGraph, n_walkers, steps=10, information=None, rng=None, out=None) -> np.ndarray:
+    rng = make_rng(rng)
+    take = _batch_take(C, n_walkers, information)
+    counting = recording()
+    teleports = 0
+
+    current_nodes = np.zeros(n_walkers, dtype=np.int64)
+    actual_info = np.zeros(n_walkers)
+    info_steps = np.empty((n_walkers, steps)) if out is None else out
+
+    for i in range(steps):
+        coin_flips = rng.random(n_walkers)
+        draws = rng.random(n_walkers)
+        neighbors, isolated = csr_neighbors(C.offsets, C.indices, current_nodes, draws)
+        jump = (coin_flips < PAGERANK_PROB) | isolated
+        current_nodes = np.where(jump, other_indices(C.n_nodes, current_nodes, draws), neighbors)
+        actual_info += take(current_nodes)
+        info_steps[:, i] = actual_info
+        if counting:
+            teleports += np.count_nonzero(jump)
+
+    count('steps', n_walkers * steps)
+    count('teleports', teleports)
+    return info_steps
+
+
+def walk_batch(C: CSRGraph, method, n_walkers, steps=10, tau=5, information=None, rng=None, out=None) -> np.ndarray:
+    """
+    Run n_walkers walks of the given method in lockstep.
+
+    Args:
+        C (CSRGraph): The graph to walk on.
+        method (str): 'random', 'ars' or 'pagerank'.
+        n_walkers (int): Number of independent walkers (tests).
+        steps (int): Number of steps of each walk.
+        tau (int): Steps without information before an ARS jump (ignored by the other methods).
+        information (np.ndarray | InformationState): (n_walkers, n_nodes) matrix consumed in place,
+            an InformationState with n_walkers walkers, or None.
+        rng (np.random.Generator | int): Random generator or seed.
+        out (np.ndarray): Preallocated (n_walkers, steps) result, or None.
+
+    Returns:
+        np.ndarray: (n_walkers, steps) matrix, row k is the info_steps curve of walker k.
+    """
+    if method == 'random':
+        return random_walk_batch(C, n_walkers, steps, information, rng, out)
+    if method == 'ars':
+        return ars_walk_batch(C, n_walkers, steps, tau, information, rng, out)
+    if method == 'pagerank':
+        return pagerank_walk_batch(C, n_walkers, steps, information, rng, out)
+    raise Exception("method must be one of 'random', 'ars' or 'pagerank'")
+
+
+@timed('walk_stats')
+def walk_stats(C: CSRGraph, method, n_tests, steps=10, tau=5, batch_size=100, every=1, capacity=0,
+               rng=None) -> RunStats:
+    """
+    Run n_tests walks in batches and fold them into a RunStats as they finish.
+
+    Only one batch of curves exists at a time, so the memory used is
+    O(batch_size * steps) however many tests are run.
+
+    Args:
+        C (CSRGraph): The graph to walk on.
+        method (str): 'random', 'ars' or 'pagerank'.
+        n_tests (int): Number of walks.
+        steps (int): Number of steps of each walk.
+        tau (int): Steps without information before an ARS jump.
+        batch_size (int): Walkers advanced together.
+        every (int): Keep the statistics of one step out of every.
+        capacity (int): Curves kept by the quantile sketch, none by default.
+        rng (np.random.Generator | int): Random generator or seed.
+
+    Returns:
+        RunStats: Per-step statistics of the information gained.
+    """
+    rng = make_rng(rng)
+    stats = RunStats(steps, every, capacity, rng=rng.spawn(1)[0])
+    out = np.empty((min(batch_size, n_tests), steps))
+    for first in range(0, n_tests, batch_size):
+        n_walkers = min(batch_size, n_tests - first)
+        stats.add_batch(walk_batch(C, method, n_walkers, steps, tau, rng=rng, out=out[:n_walkers]))
+    return stats
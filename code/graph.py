@@ -1,8 +1,14 @@
 from math import trunc
 import networkx as nx
-import random
+import numpy as np
 import cluster_erdos as ce
 
+from cluster_index import ClusterIndex
+from csr_graph import CSRGraph, csr_from_edges
+from information import InformationState, NodeInformation
+from instrumentation import timed
+from seeding import make_rng
+
 INTRACLUSTER_EDGE_PROB = 0.65
 INTERCLUSTER_EDGE_PROB = 0.15
 
@@ -13,10 +19,35 @@ def truncate_float(float_number, decimal_places):
     return int(float_number * multiplier) / multiplier
 
 
-def graph_with_clusters(n_clusters=5, n_nodes=40, n_tests=5, perc=None) -> nx.Graph:
+def set_graph_information(G: nx.Graph, values) -> InformationState:
+    """
+    Attach one information value per node, shared by the n_tests test slots.
+
+    The values live once in G.graph['information_state']; G.nodes[node]['information']
+    is a NodeInformation view that reads and consumes them per test like the
+    [info] * n_tests list it replaces.
+
+    Args:
+        G (nx.Graph): The graph, with G.graph['n_tests'] set.
+        values (list): Information of each node, in the order of G.nodes.
+
+    Returns:
+        InformationState: The state backing the node attributes.
+    """
+    state = InformationState(values, G.graph['n_tests'], list(G.nodes))
+    G.graph['information_state'] = state
+    for k, node in enumerate(G.nodes):
+        G.nodes[node]['information'] = NodeInformation(state, k)
+    return state
+
+
+@timed('graph_with_clusters')
+def graph_with_clusters(n_clusters=5, n_nodes=40, n_tests=5, perc=None, rng=None) -> nx.Graph:
     if n_nodes < n_clusters:
         raise Exception("n_nodes must be greater than n_clusters")
 
+    rng = make_rng(rng)
+
     nodes = [str(i + 1) for i in range(n_nodes)]
     G = nx.Graph()
     # G = nx.DiGraph()
@@ -26,100 +57,228 @@ def graph_with_clusters(n_clusters=5, n_nodes=40, n_tests=5, perc=None) -> nx.Gr
     G.graph['n_nodes'] = n_nodes
     G.graph['n_tests'] = n_tests
 
-    cluster_list = create_subgroups(nodes, n_clusters)
-
-    # add intra-cluster edges
-    for index, cluster in enumerate(cluster_list):
-        for node in cluster:
-            G.nodes[node]['cluster'] = index + 1
-
-        intra_cluster_edges = []
-        for node1 in cluster:
-            for node2 in cluster:
-                if node1 != node2 and random.random() < INTRACLUSTER_EDGE_PROB:
-                    intra_cluster_edges.append((node1, node2))
-        intra_cluster_edges = list(set(intra_cluster_edges))
-        G.add_edges_from(intra_cluster_edges)
-
-    # add inter-cluster edges
-    inter_cluster_edges = []
-    for i in range(n_clusters):
-        for cluster1 in cluster_list:
-            for cluster2 in cluster_list:
-                if cluster1 != cluster2 and random.random() < INTERCLUSTER_EDGE_PROB:
-                    inter_cluster_edges.append((random.choice(cluster1), random.choice(cluster2)))
-    inter_cluster_edges = list(set(inter_cluster_edges))
-    G.add_edges_from(inter_cluster_edges)
+    cluster_list = create_subgroups(nodes, n_clusters, rng)
+    sizes = np.array([len(cluster) for cluster in cluster_list])
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    clusters = np.repeat(np.arange(1, n_clusters + 1), sizes)
+    nx.set_node_attributes(G, dict(zip(nodes, clusters.tolist())), 'cluster')
+
+    # add intra-cluster edges: every ordered pair of nodes used to be tried with
+    # INTRACLUSTER_EDGE_PROB, so an unordered pair is an edge with probability
+    # 1 - (1 - p)^2. Draw how many pairs of the cluster are edges, then which ones
+    pair_prob = 1 - (1 - INTRACLUSTER_EDGE_PROB) ** 2
+    src, dst = [], []
+    for start, size in zip(starts, sizes):
+        n_pairs = size * (size - 1) // 2
+        pairs = rng.choice(n_pairs, rng.binomial(n_pairs, pair_prob), replace=False) if n_pairs else []
+        a, b = ce.pair_decode(np.asarray(pairs, dtype=np.int64), size)
+        src.append(start + a)
+        dst.append(start + b)
+
+    # add inter-cluster edges: n_clusters tries with INTERCLUSTER_EDGE_PROB per
+    # ordered pair of clusters, each one joining random nodes of the two clusters
+    tries = rng.binomial(n_clusters, INTERCLUSTER_EDGE_PROB, (n_clusters, n_clusters))
+    np.fill_diagonal(tries, 0)
+    cluster1, cluster2 = np.nonzero(tries)
+    n_tries = tries[cluster1, cluster2]
+    cluster1, cluster2 = np.repeat(cluster1, n_tries), np.repeat(cluster2, n_tries)
+    src.append(starts[cluster1] + (rng.random(len(cluster1)) * sizes[cluster1]).astype(np.int64))
+    dst.append(starts[cluster2] + (rng.random(len(cluster2)) * sizes[cluster2]).astype(np.int64))
+
+    edges = set(zip(np.concatenate(src).tolist(), np.concatenate(dst).tolist()))
+    G.add_edges_from((nodes[u], nodes[v]) for u, v in edges)
+    G.graph['cluster_index'] = ClusterIndex.from_edges(list(edges), clusters)
 
     # randomly select half of the clusters to have no information
     if perc is None:
-        clusters_with_info = random.sample(range(1, n_clusters + 1), n_clusters // 2)
+        n_clusters_with_info = n_clusters // 2
     else:
-        clusters_with_info = random.sample(range(1, n_clusters + 1), int(n_clusters * perc))
+        n_clusters_with_info = int(n_clusters * perc)
+    clusters_with_info = rng.choice(np.arange(1, n_clusters + 1), n_clusters_with_info, replace=False)
 
-    total_information = 0
-
-    for node in G.nodes:
-        info = random.random() if G.nodes[node]['cluster'] in clusters_with_info else 0
-        G.nodes[node]['information'] = []
+    values = np.where(np.isin(clusters, clusters_with_info), rng.random(n_nodes), 0.0)
+    for node, info in zip(nodes, values.tolist()):
         G.nodes[node]['colour'] = 'green' if info > 0 else 'red'
-        for _ in range(n_tests):
-            G.nodes[node]['information'].append(info)
-        total_information += info
 
-    G.graph['total_information'] = total_information
+    set_graph_information(G, values)
+    G.graph['total_information'] = float(values.sum())
+    G.graph['clusters_with_info'] = set(clusters_with_info.tolist())
 
     return G
 
 
-def graph_erdos(n_clusters=10, avgcl=20, mc=5, mi=2, n_tests=5) -> nx.Graph:
-    erdos_graph = ce.g_make(n_clusters, avgcl, mc, mi)
+@timed('graph_erdos')
+def graph_erdos(n_clusters=10, avgcl=20, mc=5, mi=2, n_tests=5, rng=None) -> nx.Graph:
+    edges, clusters, cluster_index = ce.g_make_edges(n_clusters, avgcl, mc, mi, rng, return_index=True)
 
-    n_nodes = len(erdos_graph)
+    n_nodes = len(clusters)
 
     G = nx.Graph()
 
     G.graph['n_clusters'] = n_clusters
     G.graph['n_nodes'] = n_nodes
     G.graph['n_tests'] = n_tests
+    G.graph['cluster_index'] = cluster_index
 
-    nodes = [str(i) for i in range(n_nodes)]
-    G.add_nodes_from(nodes)
-
-    for index, (cl, outlinks) in enumerate(erdos_graph):
-        node = nodes[index]
-        G.nodes[node]['cluster'] = cl
-        for dest in outlinks:
-            if node != str(dest):
-                G.add_edge(node, str(dest))
+    G.add_nodes_from((node, {'cluster': cl}) for node, cl in enumerate(clusters.tolist()))
+    G.add_edges_from(edges.tolist())
 
     G.graph['total_information'] = 0
 
     return G
 
 
-def modify_graph_information(G: nx.Graph, perc: float) -> nx.Graph:
-    for node in G.nodes:
-        G.nodes[node]['information'] = []
+@timed('csr_erdos')
+def csr_erdos(n_clusters=10, avgcl=20, mc=5, mi=2, rng=None) -> CSRGraph:
+    """
+    Same graph as graph_erdos, built directly in compiled form without networkx.
 
-    clusters_with_info = random.sample(range(G.graph['n_clusters']), int(G.graph['n_clusters'] * perc))
-    # print(perc, clusters_with_info)
+    Returns:
+        CSRGraph: The graph, with its cluster index and no information.
+    """
+    edges, clusters, cluster_index = ce.g_make_edges(n_clusters, avgcl, mc, mi, rng, return_index=True)
+    return csr_from_edges(len(clusters), edges, cluster_index=cluster_index)
 
-    total_information = 0
 
-    for node in G.nodes:
-        info = random.random() if G.nodes[node]['cluster'] in clusters_with_info else 0
-        for _ in range(G.graph['n_tests']):
-            G.nodes[node]['information'].append(info)
-        total_information += info
-        G.nodes[node]['colour'] = 'green' if info > 0 else 'red'
+def graph_cluster_index(G: nx.Graph) -> ClusterIndex:
+    """
+    Cluster index (node offsets, labels, sizes, inter-cluster edges and cluster graph) of G,
+    the only record of its clusters.
 
+    Stored by graph_erdos and graph_with_clusters; for other graphs with contiguous
+    clusters it is built from the 'cluster' attribute of the nodes and the edges on
+    first use.
+    """
+    if 'cluster_index' not in G.graph:
+        index = {node: k for k, node in enumerate(G.nodes)}
+        edges = [(index[u], index[v]) for u, v in G.edges]
+        G.graph['cluster_index'] = ClusterIndex.from_edges(edges, [G.nodes[node]['cluster'] for node in G.nodes])
+    return G.graph['cluster_index']
+
+
+def graph_cluster_information(G: nx.Graph, test_index=None) -> np.ndarray:
+    """
+    Information of each cluster, in increasing label order: the total, or what is
+    left for a test if test_index is given.
+    """
+    state = G.graph['information_state']
+    values = state.values if test_index is None else state.available(test_index)
+    return graph_cluster_index(G).reduce(values)
+
+
+def graph_cluster_ranges(G: nx.Graph) -> dict:
+    """
+    Map of each cluster label to the positions (in G.nodes order) of its nodes,
+    from graph_cluster_index(G).
+
+    Returns:
+        dict: {cluster: range of node positions}.
+    """
+    return graph_cluster_index(G).ranges()
+
+
+def _information_state(G: nx.Graph) -> InformationState:
+    # the information state of G (created empty if needed), with the set of
+    # clusters holding information kept up to date in G.graph['clusters_with_info']
+    if 'information_state' not in G.graph:
+        set_graph_information(G, np.zeros(G.number_of_nodes()))
+        nx.set_node_attributes(G, 'red', 'colour')
+        G.graph['total_information'] = 0
+        G.graph['clusters_with_info'] = set()
+    state = G.graph['information_state']
+    if 'clusters_with_info' not in G.graph:
+        G.graph['clusters_with_info'] = {cluster for cluster, nodes in graph_cluster_ranges(G).items()
+                                         if state.values[nodes.start:nodes.stop].any()}
+    return state
+
+
+def _set_cluster_values(G: nx.Graph, clusters, draw):
+    # replace the information of the nodes of clusters by draw(n_nodes), touching only those nodes
+    state = _information_state(G)
+    ranges = graph_cluster_ranges(G)
+    total_information = G.graph['total_information']
+    for cluster in clusters:
+        positions = slice(ranges[cluster].start, ranges[cluster].stop)
+        values = draw(len(ranges[cluster]))
+        total_information += float(values.sum() - state.values[positions].sum())
+        state.set_values(positions, values)
+        colour = 'green' if values.any() else 'red'
+        for node in state.nodes[positions]:
+            G.nodes[node]['colour'] = colour
     G.graph['total_information'] = total_information
 
+
+def graph_set_cluster_information(G: nx.Graph, clusters, rng=None) -> nx.Graph:
+    """
+    Give new random information to the nodes of some clusters.
+
+    Only the nodes of those clusters are touched, and G.graph['total_information']
+    is updated incrementally.
+
+    Args:
+        G (nx.Graph): The graph.
+        clusters (list): Clusters that get information.
+        rng (np.random.Generator | int): Random generator or seed.
+
+    Returns:
+        nx.Graph: The graph, modified in place.
+    """
+    rng = make_rng(rng)
+    _set_cluster_values(G, clusters, rng.random)
+    G.graph['clusters_with_info'].update(clusters)
+    return G
+
+
+def graph_remove_cluster_information(G: nx.Graph, clusters) -> nx.Graph:
+    """
+    Remove the information of the nodes of some clusters, touching only those nodes.
+
+    Args:
+        G (nx.Graph): The graph.
+        clusters (list): Clusters that lose their information.
+
+    Returns:
+        nx.Graph: The graph, modified in place.
+    """
+    _set_cluster_values(G, clusters, np.zeros)
+    G.graph['clusters_with_info'].difference_update(clusters)
+    return G
+
+
+@timed('modify_graph_information')
+def modify_graph_information(G: nx.Graph, perc: float, rng=None) -> nx.Graph:
+    rng = make_rng(rng)
+    clusters = list(graph_cluster_ranges(G))
+    clusters_with_info = rng.choice(clusters, int(G.graph['n_clusters'] * perc), replace=False).tolist()
+    # print(perc, clusters_with_info)
+
+    _information_state(G)
+    graph_remove_cluster_information(G, G.graph['clusters_with_info'] - set(clusters_with_info))
+    graph_set_cluster_information(G, clusters_with_info, rng)
+
     return G
 
 
-def graph_add_information(G: nx.Graph, perc: float, prev_clusters=None, previous_perc=0) -> nx.Graph:
+@timed('graph_add_information')
+def graph_add_information(G: nx.Graph, perc: float, prev_clusters=None, previous_perc=0, rng=None) -> nx.Graph:
+    """
+    Leave information in perc of the clusters: prev_clusters plus enough new ones.
+
+    The graph can be reused across coverage levels. Clusters that already hold
+    information keep it, the new ones get random values and the clusters left
+    out lose theirs, so only the nodes of those clusters are touched.
+
+    Args:
+        G (nx.Graph): The graph.
+        perc (float): Fraction of clusters with information.
+        prev_clusters (list): Clusters selected by the previous call.
+        previous_perc (float): Fraction of the previous call.
+        rng (np.random.Generator | int): Random generator or seed.
+
+    Returns:
+        tuple: (G, clusters with information).
+    """
+    rng = make_rng(rng)
     if prev_clusters is None or previous_perc == 0:
         prev_clusters = []
 
@@ -128,69 +287,44 @@ def graph_add_information(G: nx.Graph, perc: float, prev_clusters=None, previous
     perc_to_add = perc - previous_perc
     # round up
     perc_to_add = round(perc_to_add, 2)
-    clusters = list(range(G.graph['n_clusters']))
+    clusters = list(graph_cluster_ranges(G))
 
     selectable_clusters = [c for c in clusters if c not in prev_clusters]
-    clusters_with_info = prev_clusters + random.sample(selectable_clusters, int(G.graph['n_clusters'] * perc_to_add))
+    clusters_with_info = prev_clusters + rng.choice(selectable_clusters, int(G.graph['n_clusters'] * perc_to_add),
+                                                    replace=False).tolist()
 
     if perc == 1:
         clusters_with_info = clusters
-    
-    total_information = 0
-    
-    for node in G.nodes:
-        info = random.random() if G.nodes[node]['cluster'] in clusters_with_info else 0
-        
-        if 'information' not in G.nodes[node]:
-            G.nodes[node]['information'] = [info] * G.graph['n_tests']
-        else:
-            info = G.nodes[node]['information'][0]
-        
-        total_information += info
-        G.nodes[node]['colour'] = 'green' if info > 0 else 'red'
-        
-    G.graph['total_information'] = total_information
-    
-    return G, clusters_with_info
 
+    _information_state(G)
+    informed = G.graph['clusters_with_info']
+    graph_remove_cluster_information(G, informed - set(clusters_with_info))
+    graph_set_cluster_information(G, [c for c in clusters_with_info if c not in informed], rng)
+
+    return G, clusters_with_info
 
 
 def graph_get_total_information(G: nx.Graph, test_index=0) -> float:
-    total_information = 0
-    for node in G.nodes:
-        info = G.nodes[node]['information'][test_index]
-        total_information += info
-    return total_information
+    return G.graph['information_state'].remaining(test_index)
 
 
-def create_subgroups(node_list, n_subgroups):
+def create_subgroups(node_list, n_subgroups, rng=None):
     """
     Create the communities of the graph.
 
     Args:
         node_list (list): List of nodes in the graph.
         n_subgroups (int): Number of communities to create.
+        rng (np.random.Generator | int): Random generator or seed.
 
     Returns:
         list: List of lists, each list containing the nodes of a community.
     """
-    subgroup_sizes = []
-
-    # at least one node per subgroup
-    for i in range(n_subgroups):
-        subgroup_sizes.append(1)
+    rng = make_rng(rng)
 
-    # distribute the rest of the nodes
-    while sum(subgroup_sizes) != len(node_list):
-        subgroup_sizes[random.randint(0, n_subgroups - 1)] += 1
+    # at least one node per subgroup, the rest distributed uniformly at random
+    subgroup_sizes = 1 + rng.multinomial(len(node_list) - n_subgroups, [1 / n_subgroups] * n_subgroups)
 
     # create the subgroups
-    subgroups = []
-    for i in range(n_subgroups):
-        subgroup = []
-        for j in range(subgroup_sizes[i]):
-            node_name_position = sum(subgroup_sizes[0:i]) + j
-            subgroup.append(node_list[node_name_position])
-        subgroups.append(subgroup)
-
-    return subgroups
+    bounds = np.concatenate(([0], np.cumsum(subgroup_sizes))).tolist()
+    return [node_list[bounds[i]:bounds[i + 1]] for i in range(n_subgroups)]
@@ -0,0 +1,160 @@
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from cluster_index import ClusterIndex
+from csr_graph import CSRGraph
+from graph import csr_erdos
+
+#
+#   On-disk storage of compiled graphs. A graph is a directory with one raw
+#   .npy file per array plus a metadata.json with the generator parameters, so
+#   it can be opened with np.load(mmap_mode='r'): worker processes that load
+#   the same graph share a single page-cached copy instead of private ones.
+#   The clusters are saved as the arrays of the graph's ClusterIndex.
+#
+#   Every save writes a new version directory inside the graph directory and
+#   then points the CURRENT file at it with an atomic rename, so readers see
+#   the old graph or the new one, never a partial one, and concurrent writers
+#   never remove a directory another one is filling. The replaced version is
+#   removed; a reader that had mapped it keeps its arrays, and one that was
+#   still opening its files retries with the new version. Two writers racing
+#   on the same graph may leave an unused version directory behind.
+#
+
+GRAPHS_PATH = 'graphs/'
+
+_CURRENT = 'CURRENT'
+_ARRAYS = ('offsets', 'indices', 'information', 'cluster_offsets', 'cluster_labels', 'inter_edges')
+
+
+def _arrays(C: CSRGraph) -> dict:
+    index = C.cluster_index
+    return {'offsets': C.offsets, 'indices': C.indices, 'information': C.information,
+            'cluster_offsets': None if index is None else index.offsets,
+            'cluster_labels': None if index is None else index.labels,
+            'inter_edges': None if index is None else index.inter_edges}
+
+
+def save_graph(path, C: CSRGraph, parameters=None, seed=None):
+    """
+    Save a compiled graph to the directory path (replacing the graph saved there, if any).
+
+    Args:
+        path (str): Directory of the graph.
+        C (CSRGraph): The graph.
+        parameters (dict): Generator parameters, e.g. n_clusters, avgcl, mc, mi.
+        seed (int): Seed the graph was generated with.
+    """
+    os.makedirs(path, exist_ok=True)
+    version_path = tempfile.mkdtemp(dir=path, prefix='version-')
+    arrays = {name: array for name, array in _arrays(C).items() if array is not None}
+    for name, array in arrays.items():
+        np.save(os.path.join(version_path, name + '.npy'), array)
+
+    metadata = {
+        'parameters': parameters or {},
+        'seed': seed,
+        'n_nodes': C.n_nodes,
+        'n_edges': C.n_edges,
+        'nodes': None if isinstance(C.nodes, range) else C.nodes,
+        'arrays': list(arrays),
+    }
+    with open(os.path.join(version_path, 'metadata.json'), 'w') as f:
+        json.dump(metadata, f)
+
+    previous = _current_version(path)
+    fd, tmp_path = tempfile.mkstemp(dir=path, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        f.write(os.path.basename(version_path))
+    os.replace(tmp_path, os.path.join(path, _CURRENT))
+    if previous is not None:
+        shutil.rmtree(os.path.join(path, previous), ignore_errors=True)
+
+
+def _current_version(path):
+    # name of the version directory the graph at path points to, or None
+    try:
+        with open(os.path.join(path, _CURRENT)) as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _load_version(version_path, mmap_mode):
+    with open(os.path.join(version_path, 'metadata.json')) as f:
+        metadata = json.load(f)
+
+    arrays = dict.fromkeys(_ARRAYS)
+    for name in metadata['arrays']:
+        arrays[name] = np.load(os.path.join(version_path, name + '.npy'), mmap_mode=mmap_mode)
+
+    cluster_index = None
+    if arrays['cluster_offsets'] is not None:
+        cluster_index = ClusterIndex(arrays['cluster_offsets'], arrays['inter_edges'], arrays['cluster_labels'])
+    C = CSRGraph(arrays['offsets'], arrays['indices'], arrays['information'], cluster_index, metadata['nodes'])
+    return C, metadata
+
+
+def load_graph(path, mmap_mode='r'):
+    """
+    Load a graph saved with save_graph.
+
+    Args:
+        path (str): Directory of the graph.
+        mmap_mode (str): Passed to np.load; 'r' maps the arrays read-only, None reads them into memory.
+
+    Returns:
+        tuple: (CSRGraph, metadata dict).
+    """
+    while True:
+        version = _current_version(path)
+        if version is None:
+            raise Exception(f"no graph saved at {path}")
+        try:
+            return _load_version(os.path.join(path, version), mmap_mode)
+        except FileNotFoundError:
+            # replaced while it was being opened: load the new version
+            if _current_version(path) == version:
+                raise
+
+
+class GraphCache:
+    """
+    Cache of graph_erdos graphs keyed by their generator parameters and seed.
+
+    Args:
+        directory (str): Where the graphs are stored.
+    """
+
+    def __init__(self, directory=GRAPHS_PATH):
+        self.directory = directory
+
+    def path(self, n_clusters, avgcl, mc, mi, seed) -> str:
+        if seed is None:
+            raise Exception("the graph cache needs a seed, a graph drawn without one is not the graph of its key")
+        return os.path.join(self.directory, f'erdos_{n_clusters}_{avgcl}_{mc}_{mi}_{seed}')
+
+    def __contains__(self, key) -> bool:
+        return os.path.exists(os.path.join(self.path(*key), _CURRENT))
+
+    def get(self, n_clusters, avgcl, mc, mi, seed, mmap_mode='r') -> CSRGraph:
+        """
+        Load the graph with these parameters, generating and saving it first if needed.
+        """
+        path = self.path(n_clusters, avgcl, mc, mi, seed)
+        if (n_clusters, avgcl, mc, mi, seed) not in self:
+            C = csr_erdos(n_clusters, avgcl, mc, mi, seed)
+            parameters = {'n_clusters': n_clusters, 'avgcl': avgcl, 'mc': mc, 'mi': mi}
+            save_graph(path, C, parameters, seed)
+        return load_graph(path, mmap_mode)[0]
+
+    def put(self, C: CSRGraph, n_clusters, avgcl, mc, mi, seed):
+        """
+        Store a graph under these parameters, e.g. after setting its information.
+        """
+        parameters = {'n_clusters': n_clusters, 'avgcl': avgcl, 'mc': mc, 'mi': mi}
+        save_graph(self.path(n_clusters, avgcl, mc, mi, seed), C, parameters, seed)
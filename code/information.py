@@ -0,0 +1,148 @@
+import networkx as nx
+import numpy as np
+
+#
+#   Information consumed by the walks, kept apart from the graph topology.
+#
+#   The value of every node is stored once and never modified. What a walker
+#   has already collected is recorded in a mark matrix: node k counts as
+#   consumed by walker w when marks[w, k] equals the current epoch of w.
+#   Resetting a walker (or all of them) only bumps its epoch, so a graph can
+#   be reused for any number of runs without copying it.
+#
+
+_MAX_EPOCH = np.iinfo(np.uint32).max
+
+
+class InformationState:
+    """
+    Resettable per-walker view of the information of a graph.
+
+    Args:
+        values (array-like): Information of each node.
+        n_walkers (int): Number of independent walkers (tests) sharing the values.
+        nodes (list): Node ids, nodes[k] is the id of node k. Defaults to 0..n_nodes-1.
+    """
+
+    def __init__(self, values, n_walkers=1, nodes=None):
+        self.values = np.asarray(values, dtype=np.float64)
+        self.n_walkers = n_walkers
+        self.nodes = list(range(len(self.values))) if nodes is None else list(nodes)
+        self.index = {node: k for k, node in enumerate(self.nodes)}
+        self._marks = np.zeros((n_walkers, len(self.values)), dtype=np.uint32)
+        self._epochs = np.ones(n_walkers, dtype=np.uint32)
+        self._walkers = np.arange(n_walkers)
+
+    @classmethod
+    def from_graph(cls, G: nx.Graph, n_walkers=None, test_index=0):
+        """
+        Build the state from the 'information' attribute of the nodes of G.
+
+        Args:
+            G (nx.Graph): Graph with information (see graph_add_information).
+            n_walkers (int): Number of walkers, G.graph['n_tests'] by default.
+            test_index (int): Test slot the values are read from.
+        """
+        n_walkers = G.graph['n_tests'] if n_walkers is None else n_walkers
+        nodes = list(G.nodes)
+        values = [G.nodes[node]['information'][test_index] if 'information' in G.nodes[node] else 0
+                  for node in nodes]
+        return cls(values, n_walkers, nodes)
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.values)
+
+    def consumed(self, k, walker=0) -> bool:
+        return self._marks[walker, k] == self._epochs[walker]
+
+    def take(self, k, walker=0) -> float:
+        """
+        Collect the information of node k for a walker: returns its value the
+        first time and 0 afterwards, until the walker is reset.
+        """
+        if self._marks[walker, k] == self._epochs[walker]:
+            return 0
+        self._marks[walker, k] = self._epochs[walker]
+        return self.values[k]
+
+    def consume(self, k, walker=0):
+        self._marks[walker, k] = self._epochs[walker]
+
+    def restore(self, k, walker=0):
+        self._marks[walker, k] = self._epochs[walker] - 1
+
+    def take_batch(self, nodes) -> np.ndarray:
+        """
+        Vectorized take for all walkers at once, walker w collecting nodes[w].
+        """
+        info = np.where(self._marks[self._walkers, nodes] == self._epochs, 0.0, self.values[nodes])
+        self._marks[self._walkers, nodes] = self._epochs
+        return info
+
+    def set_values(self, nodes, values):
+        """
+        Replace the information of some nodes (a slice or an index array); every
+        walker can collect the new values, even on nodes it had consumed.
+        """
+        self.values[nodes] = values
+        self._marks[:, nodes] = (self._epochs - 1)[:, np.newaxis]
+
+    def available(self, walker=0) -> np.ndarray:
+        """
+        Information each node still holds for a walker.
+        """
+        return np.where(self._marks[walker] == self._epochs[walker], 0.0, self.values)
+
+    def remaining(self, walker=0) -> float:
+        return float(self.values[self._marks[walker] != self._epochs[walker]].sum())
+
+    def reset(self, walker=None):
+        """
+        Restore all the information for one walker, or for every walker if None.
+        """
+        epochs = self._epochs if walker is None else self._epochs[walker:walker + 1]
+        if epochs.max() == _MAX_EPOCH:
+            # epochs are about to wrap around: fall back to clearing the marks
+            marks = self._marks if walker is None else self._marks[walker:walker + 1]
+            marks.fill(0)
+            epochs.fill(0)
+        epochs += 1
+
+
+class NodeInformation:
+    """
+    Information of one node as seen by each test, backed by an InformationState.
+
+    Behaves like the [info] * n_tests list the graphs used to store on every
+    node: node_information[test] is the information still available to that
+    test and node_information[test] = 0 consumes it.
+    """
+
+    __slots__ = ('state', 'k')
+
+    def __init__(self, state: InformationState, k):
+        self.state = state
+        self.k = k
+
+    def __len__(self):
+        return self.state.n_walkers
+
+    def __iter__(self):
+        return (self[test] for test in range(len(self)))
+
+    def __getitem__(self, test):
+        if self.state.consumed(self.k, test):
+            return 0
+        return float(self.state.values[self.k])
+
+    def __setitem__(self, test, value):
+        if value == 0:
+            self.state.consume(self.k, test)
+        elif value == self.state.values[self.k]:
+            self.state.restore(self.k, test)
+        else:
+            raise Exception("the information of a node is shared by all tests, it can only be consumed or restored")
+
+    def __repr__(self):
+        return repr(list(self))
@@ -0,0 +1,188 @@
+import cProfile
+import io
+import json
+import pstats
+import time
+import tracemalloc
+
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+
+#
+#   Per-phase timing and event counters for experiments. Nothing is recorded
+#   unless a run is open:
+#
+#       with record('sweep 50 clusters', profile=True) as run:
+#           ...
+#       print(run.summary())
+#       run.export_json('run.json')
+#
+#   The generation, walk, sweep and plot functions report into the open run
+#   through timer / timed (wall time and number of calls per phase) and count
+#   (steps, jumps, resets, teleports). Outside a run they cost one check.
+#   Timers nest, so a phase's time includes the phases it calls.
+#
+#   Counters of the walks:
+#       steps      steps walked
+#       jumps      ARS long jumps (tau steps without information, or a node without neighbours)
+#       resets     ARS clock resets (information found)
+#       teleports  random / PageRank walk jumps to a uniform node
+#
+
+_RUN = None
+
+
+class Recorder:
+    """
+    Timers and counters of one run.
+
+    Attributes:
+        name (str): Name of the run.
+        timers (dict): {phase: [total seconds, calls]}.
+        counters (dict): {event: count}.
+        profile (str): cProfile report (top functions by cumulative time), if requested.
+        memory (dict): tracemalloc peak and top allocation sites, if requested.
+    """
+
+    def __init__(self, name='run'):
+        self.name = name
+        self.timers = {}
+        self.counters = {}
+        self.profile = None
+        self.memory = None
+
+    def add_time(self, phase, seconds, calls=1):
+        timer = self.timers.setdefault(phase, [0.0, 0])
+        timer[0] += seconds
+        timer[1] += calls
+
+    def add_count(self, event, n=1):
+        self.counters[event] = self.counters.get(event, 0) + int(n)
+
+    def merge(self, records: dict):
+        """
+        Add the timers and counters of another run (see to_dict), e.g. from a worker process.
+        """
+        for phase, (seconds, calls) in records['timers'].items():
+            self.add_time(phase, seconds, calls)
+        for event, n in records['counters'].items():
+            self.add_count(event, n)
+
+    def to_dict(self) -> dict:
+        return {'name': self.name, 'timers': self.timers, 'counters': self.counters,
+                'profile': self.profile, 'memory': self.memory}
+
+    def export_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=1)
+
+    def summary(self) -> str:
+        """
+        Table of the phases (slowest first) and of the counters.
+        """
+        lines = [f'Run: {self.name}', f"{'phase':<40} {'total (s)':>10} {'calls':>8} {'per call (ms)':>14}"]
+        for phase, (seconds, calls) in sorted(self.timers.items(), key=lambda item: -item[1][0]):
+            lines.append(f'{phase:<40} {seconds:>10.4f} {calls:>8} {1000 * seconds / calls:>14.4f}')
+        if self.counters:
+            lines.append(f"{'counter':<40} {'count':>10}")
+            for event, n in sorted(self.counters.items()):
+                lines.append(f'{event:<40} {n:>10}')
+        if self.memory is not None:
+            lines.append(f"Peak traced memory: {self.memory['peak'] / 2 ** 20:.1f} MB")
+        return '\n'.join(lines)
+
+
+def recording() -> bool:
+    return _RUN is not None
+
+
+@contextmanager
+def record(name='run', profile=False, memory=False, top=30):
+    """
+    Open a run: timers and counters report into the returned Recorder until the block ends.
+
+    Args:
+        name (str): Name of the run.
+        profile (bool): Also run cProfile and keep its top functions.
+        memory (bool): Also trace allocations with tracemalloc and keep the peak and top sites.
+        top (int): Lines kept from the profile and allocation reports.
+    """
+    global _RUN
+    previous, run = _RUN, Recorder(name)
+    _RUN = run
+
+    profiler = cProfile.Profile() if profile else None
+    started_tracing = memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    elif memory:
+        tracemalloc.reset_peak()
+    if profiler is not None:
+        profiler.enable()
+
+    start = time.perf_counter()
+    try:
+        yield run
+    finally:
+        run.add_time('total', time.perf_counter() - start)
+        if profiler is not None:
+            profiler.disable()
+            report = io.StringIO()
+            pstats.Stats(profiler, stream=report).sort_stats('cumulative').print_stats(top)
+            run.profile = report.getvalue()
+        if memory:
+            _, peak = tracemalloc.get_traced_memory()
+            sites = tracemalloc.take_snapshot().statistics('lineno')[:top]
+            run.memory = {'peak': peak, 'top': [str(site) for site in sites]}
+            if started_tracing:
+                tracemalloc.stop()
+        _RUN = previous
+
+
+@contextmanager
+def _timer(run, phase):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        run.add_time(phase, time.perf_counter() - start)
+
+
+def timer(phase):
+    """
+    Context manager timing a phase of the open run (does nothing without one).
+    """
+    if _RUN is None:
+        return nullcontext()
+    return _timer(_RUN, phase)
+
+
+def timed(phase):
+    """
+    Decorator timing every call of a function as a phase of the open run.
+    """
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if _RUN is None:
+                return function(*args, **kwargs)
+            with _timer(_RUN, phase):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(event, n=1):
+    """
+    Add n events to a counter of the open run (does nothing without one).
+    """
+    if _RUN is not None:
+        _RUN.add_count(event, n)
+
+
+def merge(records):
+    """
+    Add the records of a run of another process (Recorder.to_dict) to the open run.
+    """
+    if _RUN is not None and records is not None:
+        _RUN.merge(records)
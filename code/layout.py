@@ -0,0 +1,244 @@
+import os
+
+import matplotlib.colors as mcolors
+import matplotlib.pyplot as plt
+import networkx as nx
+import numpy as np
+import scipy.sparse as sp
+
+from csr_graph import CSRGraph, csr_from_graph, graph_hash
+from instrumentation import timed
+
+#
+#   Layouts for drawing the clustered graphs. kamada_kawai_layout needs the
+#   all-pairs distance matrix, O(N^2) in time and memory, so instead:
+#
+#   1. the graph of clusters (an edge where an inter-cluster edge joins two
+#      clusters, weighted by their number) is laid out with spring_layout,
+#      or when it has many clusters with force_layout, Fruchterman-Reingold
+#      whose repulsion is computed on a grid with an FFT (particle-mesh, as
+#      Barnes-Hut an O(N log N) approximation of the all-pairs forces), and
+#      scaled so that a cluster of s nodes gets a disc of radius ~sqrt(s);
+#   2. the nodes of each cluster are laid out inside its disc, with
+#      spring_layout (Fruchterman-Reingold, sparse for large clusters) on
+#      small graphs, or with a few rounds of neighbour averaging from random
+#      positions, vectorized over all the clusters, on large ones.
+#
+#   A layout is computed once per graph and seed and saved to LAYOUTS_PATH
+#   under a hash of the graph's structure. Graphs with more than
+#   RASTER_LIMIT nodes are drawn as a density image instead of one artist per
+#   node and edge.
+#
+
+LAYOUTS_PATH = 'layouts/'
+RASTER_LIMIT = 20000
+SPRING_LIMIT = 20000        # largest graph whose clusters are laid out with spring_layout
+MESH_CLUSTERS = 1000        # number of clusters from which the cluster graph uses force_layout
+
+
+def _cluster_centers(C: CSRGraph, clusters, sizes, seed):
+    # positions of the clusters, scaled to the number of nodes
+    n_clusters = len(sizes)
+    if n_clusters == 1:
+        return np.zeros((1, 2))
+
+    src = np.repeat(np.arange(C.n_nodes), C.degrees)
+    a, b = clusters[src], clusters[C.indices]
+    between = a < b
+    pairs, weights = np.unique(np.stack((a[between], b[between]), axis=1), axis=0, return_counts=True)
+
+    if n_clusters >= MESH_CLUSTERS:
+        centers = force_layout(n_clusters, pairs, weights, seed)
+    else:
+        H = nx.Graph()
+        H.add_nodes_from(range(n_clusters))
+        H.add_weighted_edges_from((u, v, w) for (u, v), w in zip(pairs.tolist(), weights.tolist()))
+        pos = nx.spring_layout(H, weight='weight', seed=seed)
+        centers = np.array([pos[k] for k in range(n_clusters)])
+    centers = centers - centers.mean(axis=0)
+    return centers / np.abs(centers).max() * 1.2 * np.sqrt(C.n_nodes)
+
+
+def _repulsion(pos, k, grid):
+    # FR repulsion k^2 / d of every node on every other one: the nodes are binned
+    # on a grid and the force field is the FFT convolution of the counts with the
+    # force of a single node, read at the cell of each node
+    low, high = pos.min(axis=0), pos.max(axis=0)
+    h = max((high - low).max(), 1e-12) / (grid - 1)
+    cells = np.minimum(((pos - low) / h).astype(np.int64), grid - 1)
+    counts = np.zeros((2 * grid, 2 * grid))
+    np.add.at(counts, (cells[:, 0], cells[:, 1]), 1)
+
+    offsets = np.fft.fftfreq(2 * grid, 1 / (2 * grid)) * h
+    dx, dy = np.meshgrid(offsets, offsets, indexing='ij')
+    d2 = dx ** 2 + dy ** 2
+    d2[0, 0] = np.inf
+    spectrum = np.fft.rfft2(counts)
+    force = np.empty_like(pos)
+    for axis, delta in enumerate((dx, dy)):
+        field = np.fft.irfft2(spectrum * np.fft.rfft2(k ** 2 * delta / d2), s=counts.shape)
+        force[:, axis] = field[cells[:, 0], cells[:, 1]]
+    return force
+
+
+def force_layout(n_nodes, edges, weights=None, seed=0, iterations=100, grid=256, gravity=1.0) -> np.ndarray:
+    """
+    Fruchterman-Reingold layout with the repulsion computed on a grid, for graphs too
+    large for spring_layout (whose repulsion is O(n_nodes^2) per iteration). A pull
+    towards the centre keeps the small components from drifting away.
+
+    Args:
+        n_nodes (int): Number of nodes.
+        edges (np.ndarray): (n_edges, 2) node pairs.
+        weights (np.ndarray): Weight of each edge, 1 by default.
+        seed (int): Seed of the initial positions.
+        iterations (int): Iterations, the displacements cool down linearly to 0.
+        grid (int): Side of the repulsion grid.
+        gravity (float): Strength of the pull towards the centre.
+
+    Returns:
+        np.ndarray: (n_nodes, 2) positions in the unit square.
+    """
+    rng = np.random.default_rng(seed)
+    pos = rng.random((n_nodes, 2))
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    weights = np.ones(len(edges)) if weights is None else np.asarray(weights, dtype=np.float64)
+    k = 1 / np.sqrt(n_nodes)
+
+    for temperature in np.linspace(0.1, 0, iterations, endpoint=False):
+        force = _repulsion(pos, k, grid) - gravity * (pos - pos.mean(axis=0))
+        # attraction d^2 / k along every edge
+        delta = pos[edges[:, 0]] - pos[edges[:, 1]]
+        pull = delta * (weights * np.hypot(delta[:, 0], delta[:, 1]) / k)[:, np.newaxis]
+        for axis in range(2):
+            force[:, axis] -= np.bincount(edges[:, 0], pull[:, axis], n_nodes)
+            force[:, axis] += np.bincount(edges[:, 1], pull[:, axis], n_nodes)
+        length = np.maximum(np.hypot(force[:, 0], force[:, 1]), 1e-12)[:, np.newaxis]
+        pos += force / length * np.minimum(length, temperature)
+
+    return pos
+
+
+def _spring_within(C: CSRGraph, order, bounds, seed):
+    # spring_layout of every cluster, in the unit disc
+    local = np.zeros((C.n_nodes, 2))
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        members = order[start:stop]
+        if len(members) == 1:
+            continue
+        H = nx.Graph()
+        H.add_nodes_from(members.tolist())
+        for node in members.tolist():
+            H.add_edges_from((node, neighbor) for neighbor in C.neighbors(node).tolist() if neighbor in H)
+        pos = nx.spring_layout(H, seed=seed)
+        local[members] = [pos[node] for node in members.tolist()]
+    return local
+
+
+def _smooth_within(C: CSRGraph, clusters, seed, rounds=10):
+    # random positions in the unit disc pulled towards their neighbours in the cluster
+    rng = np.random.default_rng(seed)
+    radius, angle = np.sqrt(rng.random(C.n_nodes)), 2 * np.pi * rng.random(C.n_nodes)
+    local = np.stack((radius * np.cos(angle), radius * np.sin(angle)), axis=1)
+
+    src = np.repeat(np.arange(C.n_nodes), C.degrees)
+    inside = clusters[src] == clusters[C.indices]
+    A = sp.csr_matrix((np.ones(inside.sum()), (src[inside], C.indices[inside])), shape=(C.n_nodes, C.n_nodes))
+    degree = np.maximum(np.asarray(A.sum(axis=1)).ravel(), 1)[:, np.newaxis]
+    for _ in range(rounds):
+        local = 0.5 * local + 0.5 * (A @ local) / degree
+
+    # spread every cluster back over the unit disc
+    centers = np.zeros((clusters.max() + 1, 2))
+    np.add.at(centers, clusters, local)
+    local -= centers[clusters] / np.bincount(clusters)[clusters][:, np.newaxis]
+    extent = np.zeros(clusters.max() + 1)
+    np.maximum.at(extent, clusters, np.hypot(local[:, 0], local[:, 1]))
+    return local / np.maximum(extent[clusters], 1e-12)[:, np.newaxis]
+
+
+@timed('layout.cluster_layout')
+def cluster_layout(G, seed=0) -> np.ndarray:
+    """
+    Cluster-aware layout: clusters first, then the nodes inside each cluster.
+
+    Args:
+        G (nx.Graph | CSRGraph): The graph; without cluster labels it is a single cluster.
+        seed (int): Seed of the layout.
+
+    Returns:
+        np.ndarray: (n_nodes, 2) positions, in the order of G.nodes.
+    """
+    C = csr_from_graph(G) if isinstance(G, nx.Graph) else G
+    labels = np.zeros(C.n_nodes, dtype=np.int64) if C.clusters is None else C.clusters
+    _, clusters = np.unique(labels, return_inverse=True)
+    sizes = np.bincount(clusters)
+
+    centers = _cluster_centers(C, clusters, sizes, seed)
+    if C.n_nodes <= SPRING_LIMIT:
+        order = np.argsort(clusters, kind='stable')
+        local = _spring_within(C, order, np.concatenate(([0], np.cumsum(sizes))), seed)
+    else:
+        local = _smooth_within(C, clusters, seed)
+    return centers[clusters] + 0.5 * np.sqrt(sizes[clusters])[:, np.newaxis] * local
+
+
+def graph_layout(G, seed=0, directory=LAYOUTS_PATH) -> dict:
+    """
+    Cached cluster_layout of G, computed and saved to directory the first time.
+
+    Returns:
+        dict: {node: (x, y)}, as the networkx layouts.
+    """
+    C = csr_from_graph(G) if isinstance(G, nx.Graph) else G
+    path = os.path.join(directory, f'{graph_hash(C)}_{seed}.npy')
+    if os.path.exists(path):
+        positions = np.load(path)
+    else:
+        positions = cluster_layout(C, seed)
+        os.makedirs(directory, exist_ok=True)
+        np.save(path, positions)
+    return dict(zip(C.nodes, positions))
+
+
+def draw_density(pos, node_color, ax=None, bins=512):
+    """
+    Draw the nodes as a density image, one colour channel per node colour.
+
+    Args:
+        pos (dict): {node: (x, y)}.
+        node_color (str | list): Colour of all the nodes, or of each node in pos order.
+        ax (matplotlib.axes.Axes): Where to draw, the current axes by default.
+        bins (int): Resolution of the image.
+    """
+    ax = plt.gca() if ax is None else ax
+    xy = np.array(list(pos.values()))
+    colors = np.array([node_color] * len(xy) if isinstance(node_color, str) else node_color)
+    extent = [xy[:, 0].min(), xy[:, 0].max(), xy[:, 1].min(), xy[:, 1].max()]
+
+    image = np.zeros((bins, bins, 3))
+    weight = np.zeros((bins, bins))
+    for color in np.unique(colors):
+        mine = colors == color
+        counts, _, _ = np.histogram2d(xy[mine, 1], xy[mine, 0], bins=bins, range=[extent[2:], extent[:2]])
+        image += counts[:, :, np.newaxis] * mcolors.to_rgb(color)
+        weight += counts
+
+    # colour of each pixel is the mix of its nodes, opacity grows with their number
+    rgba = np.zeros((bins, bins, 4))
+    filled = weight > 0
+    rgba[filled, :3] = image[filled] / weight[filled][:, np.newaxis]
+    rgba[filled, 3] = np.clip(np.log1p(weight[filled]) / np.log1p(weight.max()), 0.2, 1)
+    ax.imshow(rgba, origin='lower', extent=extent, interpolation='nearest')
+    ax.set_axis_off()
+
+
+def draw_graph(G: nx.Graph, pos, node_color, ax=None, raster_limit=RASTER_LIMIT, **kwargs):
+    """
+    nx.draw(G, pos, node_color=node_color, **kwargs), or draw_density for graphs
+    with more than raster_limit nodes.
+    """
+    if G.number_of_nodes() > raster_limit:
+        draw_density(pos, node_color, ax)
+    else:
+        nx.draw(G, pos, ax=ax, node_color=node_color, **kwargs)
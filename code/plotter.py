@@ -4,6 +4,14 @@ import networkx as nx
 import numpy as np
 import datetime
 
+from concurrent.futures import ProcessPoolExecutor
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from instrumentation import timed, timer
+from layout import draw_graph, graph_layout
+from stats import RunStats
+
 PLOTS_PATH = 'plots/'
 ARS_STEPS_PATH = PLOTS_PATH + 'ars_steps/'
 ARS_STEPS_PERC_CLUSTERS_PATH = PLOTS_PATH + 'ars_steps_perc_clusters/'
@@ -12,6 +20,9 @@ FONTSIZE = 9
 COLOR_LIST = ['green', 'yellow', 'orange', 'pink', 'red', 'gray', 'purple', 'blue', 'brown', 'cyan', 'magenta']
 SUBTEXT_FONT_SIZE = 7
 
+# when True, the plot_* functions that display their figure close it instead
+HEADLESS = False
+
 methods = {
     '1': 'Random Walk',
     '2': 'ARS',
@@ -19,12 +30,45 @@ methods = {
 }
 
 
+def _step_statistic(info_list, statistic):
+    # x values and per-step 'mean', 'variance' or 'std' of a list of info_steps
+    # curves, or of a RunStats that accumulated them
+    if isinstance(info_list, RunStats):
+        return info_list.index, getattr(info_list, statistic)
+    reduce = {'mean': np.mean, 'variance': np.var, 'std': np.std}[statistic]
+    values = reduce(info_list, axis=0)
+    return np.arange(len(values)), values
+
+
+def _curve(info_steps):
+    # x values and curve of a single info_steps curve, or the mean curve of a RunStats
+    if isinstance(info_steps, RunStats):
+        return info_steps.index, info_steps.mean
+    return np.arange(len(info_steps)), info_steps
+
+
+def _final(info_steps):
+    # information gained at the last step of a curve or of the mean curve of a RunStats
+    return _curve(info_steps)[1][-1]
+
+
+def _show():
+    # plt.show() displays and releases the current figure; headless, only release it
+    if HEADLESS:
+        plt.close()
+    else:
+        plt.show()
+
+
+@timed('plot.graph')
 def plot_graph(G):
-    pos = nx.kamada_kawai_layout(G)
-    nx.draw(G, pos, with_labels=True, node_size=150, node_color="skyblue", font_size=FONTSIZE, font_weight="bold")
+    with timer('plot.layout'):
+        pos = graph_layout(G)
+    draw_graph(G, pos, "skyblue", with_labels=True, node_size=150, font_size=FONTSIZE, font_weight="bold")
     plt.title('Clustered Graph')
-    plt.show()
+    _show()
 
+@timed('plot.erdos_graph')
 def plot_erdos_graph(G, n, p):
     # pos = nx.kamada_kawai_layout(G)
     pos = nx.circular_layout(G)
@@ -33,22 +77,26 @@ def plot_erdos_graph(G, n, p):
     
     plt.title('Grafo ER con N = ' + str(n) + ' y p = ' + str(p))
 
+@timed('plot.graph_colored')
 def plot_graph_colored(G):
     if G.graph['n_clusters'] > len(COLOR_LIST):
         print("Too many clusters to plot with different colors, using default color")
         plot_graph(G)
         return
     node_colors = [COLOR_LIST[G.nodes[node]['cluster']] for node in G.nodes]
-    pos = nx.kamada_kawai_layout(G)
-    nx.draw(G, pos, with_labels=False, node_size=70, font_size=FONTSIZE, font_weight="bold", node_color=node_colors)
+    with timer('plot.layout'):
+        pos = graph_layout(G)
+    draw_graph(G, pos, node_colors, with_labels=False, node_size=70, font_size=FONTSIZE, font_weight="bold")
     # plt.title('Clustered Graph')
-    plt.show()
+    _show()
 
 
+@timed('plot.graph_colored_by_info')
 def plot_graph_colored_by_info(G, perc=None):
     node_colors = [G.nodes[node]['colour'] for node in G.nodes]
-    pos = nx.kamada_kawai_layout(G)
-    nx.draw(G, pos, with_labels=False, node_size=70, font_size=FONTSIZE, font_weight="bold", node_color=node_colors)
+    with timer('plot.layout'):
+        pos = graph_layout(G)
+    draw_graph(G, pos, node_colors, with_labels=False, node_size=70, font_size=FONTSIZE, font_weight="bold")
 
     if perc is not None:
         plt.title('Clustered Graph with information in ' + str(perc*100) + '% of clusters')
@@ -60,128 +108,159 @@ def plot_graph_colored_by_info(G, perc=None):
         plt.scatter([], [], c=color, label=description)
 
     plt.legend(scatterpoints=1, labelspacing=1)
-    plt.show()
+    _show()
 
 
+@timed('plot.information_gained_by_step')
 def plot_information_gained_by_step(random_walk_info, total_info):
-    plt.plot(random_walk_info)
+    plt.plot(*_curve(random_walk_info))
     plt.ylim(0, total_info)
     plt.title('Information gained Random Walk')
     plt.xlabel('Time step')
     plt.ylabel('Information')
-    plt.show()
+    _show()
 
 
+@timed('plot.information_gained_by_step_ars')
 def plot_information_gained_by_step_ars(ars_info, total_info):
-    plt.plot(ars_info)
+    plt.plot(*_curve(ars_info))
     plt.ylim(0, total_info)
     plt.title('Information gained ARS')
     plt.xlabel('Time step')
     plt.ylabel('Information')
-    plt.show()
+    _show()
 
 
+@timed('plot.information_gained_by_step_pagerank')
 def plot_information_gained_by_step_pagerank(pagerank_info, total_info):
-    plt.plot(pagerank_info)
+    plt.plot(*_curve(pagerank_info))
     plt.ylim(0, total_info)
     plt.title('Information gained PageRank')
     plt.xlabel('Time step')
     plt.ylabel('Information')
-    plt.show()
+    _show()
 
 
+@timed('plot.information_gained_by_step_random_walk_and_ars')
 def plot_information_gained_by_step_random_walk_and_ars(random_walk_info, ars_info, total_info):
-    plt.plot(random_walk_info, label='Random Walk')
-    plt.plot(ars_info, label='ARS')
+    plt.plot(*_curve(random_walk_info), label='Random Walk')
+    plt.plot(*_curve(ars_info), label='ARS')
     plt.ylim(0, total_info)
     plt.title('Random Walk VS ARS')
     plt.xlabel('Time step')
     plt.ylabel('Information')
     plt.legend()
-    plt.show()
+    _show()
 
 
+@timed('plot.information_gained_by_step_pagerank_and_ars')
 def plot_information_gained_by_step_pagerank_and_ars(pagerank_info, ars_info, total_info):
-    plt.plot(pagerank_info, label='PageRank')
-    plt.plot(ars_info, label='ARS')
+    plt.plot(*_curve(pagerank_info), label='PageRank')
+    plt.plot(*_curve(ars_info), label='ARS')
     plt.ylim(0, total_info)
     plt.title('PageRank VS ARS')
     plt.xlabel('Time step')
     plt.ylabel('Information')
     plt.legend()
-    plt.show()
+    _show()
 
 
+@timed('plot.mean')
 def plot_mean(info_list, total_info, method):
-    mean_info = np.mean(info_list, axis=0)
-    plt.plot(mean_info)
+    steps, mean_info = _step_statistic(info_list, 'mean')
+    plt.plot(steps, mean_info)
     plt.ylim(0, total_info)
     plt.title(f'Mean Information gained {method}')
     plt.xlabel('Time step')
     plt.ylabel('Information')
-    plt.show()
+    _show()
 
 
+@timed('plot.variance')
 def plot_variance(info_list, method):
-    variance_info = np.var(info_list, axis=0)
-    plt.plot(variance_info)
+    steps, variance_info = _step_statistic(info_list, 'variance')
+    plt.plot(steps, variance_info)
     plt.title(f'Variance Information gained {method}')
     plt.xlabel('Time step')
     plt.ylabel('Information')
-    plt.show()
+    _show()
 
 
+@timed('plot.std')
 def plot_std(info_list, method):
-    std_info = np.std(info_list, axis=0)
-    plt.plot(std_info)
+    steps, std_info = _step_statistic(info_list, 'std')
+    plt.plot(steps, std_info)
     plt.title(f'Standard Deviation Information gained {method}')
     plt.xlabel('Time step')
     plt.ylabel('Information')
-    plt.show()
+    _show()
 
 
+@timed('plot.quantiles')
+def plot_quantiles(stats, total_info, method, quantiles=(0.05, 0.25, 0.5, 0.75, 0.95)):
+    values = stats.quantile(quantiles)
+    plt.fill_between(stats.index, stats.min, stats.max, color='lightgray', label='min - max')
+    for q, value in zip(quantiles, values):
+        plt.plot(stats.sketch_index, value, label=f'q{q:g}')
+    plt.ylim(0, total_info)
+    plt.title(f'Quantiles of Information gained {method}')
+    plt.xlabel('Time step')
+    plt.ylabel('Information')
+    plt.legend()
+    _show()
+
+
+@timed('plot.stats')
 def plot_stats(info_list, total_info, method):
+    if not isinstance(info_list, RunStats):
+        stats = RunStats(np.shape(info_list)[1], capacity=len(info_list), points=np.shape(info_list)[1])
+        stats.add_batch(info_list)
+        info_list = stats
     plot_mean(info_list, total_info, method)
     plot_variance(info_list, method)
     plot_std(info_list, method)
+    if info_list.capacity:
+        plot_quantiles(info_list, total_info, method)
 
 
+@timed('plot.2methods')
 def plot_2methods(info_list1, info_list2, total_info, method1, method2):
-    mean_info1 = np.mean(info_list1, axis=0)
-    mean_info2 = np.mean(info_list2, axis=0)
-    plt.plot(mean_info1, label=method1)
-    plt.plot(mean_info2, label=method2)
+    steps1, mean_info1 = _step_statistic(info_list1, 'mean')
+    steps2, mean_info2 = _step_statistic(info_list2, 'mean')
+    plt.plot(steps1, mean_info1, label=method1)
+    plt.plot(steps2, mean_info2, label=method2)
     plt.ylim(0, total_info)
     plt.title(f'Mean Information gained {method1} VS {method2}')
     plt.xlabel('Time step')
     plt.ylabel('Information')
     plt.legend()
     plt.savefig(PLOTS_PATH + f'{datetime.datetime.now().strftime("%Y%m%d%H%M%S")}_mean_{method1}_{method2}_.jpg')
-    plt.show()
+    _show()
 
-    var_info1 = np.var(info_list1, axis=0)
-    var_info2 = np.var(info_list2, axis=0)
-    plt.plot(var_info1, label=method1)
-    plt.plot(var_info2, label=method2)
+    steps1, var_info1 = _step_statistic(info_list1, 'variance')
+    steps2, var_info2 = _step_statistic(info_list2, 'variance')
+    plt.plot(steps1, var_info1, label=method1)
+    plt.plot(steps2, var_info2, label=method2)
     plt.title(f'Variance Information gained {method1} VS {method2}')
     plt.xlabel('Time step')
     plt.ylabel('Information')
     plt.legend()
     plt.savefig(PLOTS_PATH + f'{datetime.datetime.now().strftime("%Y%m%d%H%M%S")}_var_{method1}_{method2}_.jpg')
-    plt.show()
+    _show()
 
-    std_info1 = np.std(info_list1, axis=0)
-    std_info2 = np.std(info_list2, axis=0)
-    plt.plot(std_info1, label=method1)
-    plt.plot(std_info2, label=method2)
+    steps1, std_info1 = _step_statistic(info_list1, 'std')
+    steps2, std_info2 = _step_statistic(info_list2, 'std')
+    plt.plot(steps1, std_info1, label=method1)
+    plt.plot(steps2, std_info2, label=method2)
     plt.title(f'Standard Deviation Information gained {method1} VS {method2}')
     plt.xlabel('Time step')
     plt.ylabel('Information')
     plt.legend()
     plt.savefig(PLOTS_PATH + f'{datetime.datetime.now().strftime("%Y%m%d%H%M%S")}_std_{method1}_{method2}_.jpg')
-    plt.show()
+    _show()
 
 
+@timed('plot.3methods')
 def plot_3methods(simulation_parameters, info_list1, info_list2, info_list3, total_info, method1, method2, method3):
     n_clusters, n_nodes, n_tests = simulation_parameters
     dir_path = PLOTS_PATH + "3-methods/" + str(n_clusters) + "-clusters/"
@@ -189,12 +268,13 @@ def plot_3methods(simulation_parameters, info_list1, info_list2, info_list3, tot
     dir_path = dir_path + str(n_nodes) + "-nodes/"
     os.makedirs(dir_path, exist_ok=True)
 
-    mean_info1, mean_info2, mean_info3 = np.mean(info_list1, axis=0), np.mean(info_list2, axis=0), np.mean(info_list3,
-                                                                                                   axis=0)
+    (steps1, mean_info1), (steps2, mean_info2), (steps3, mean_info3) = (_step_statistic(info_list1, 'mean'),
+                                                                        _step_statistic(info_list2, 'mean'),
+                                                                        _step_statistic(info_list3, 'mean'))
     plt.figure()
-    plt.plot(mean_info1, label=method1)
-    plt.plot(mean_info2, label=method2)
-    plt.plot(mean_info3, label=method3)
+    plt.plot(steps1, mean_info1, label=method1)
+    plt.plot(steps2, mean_info2, label=method2)
+    plt.plot(steps3, mean_info3, label=method3)
     # plt.ylim(0, total_info)
     plt.title('Mean Information gained by method')
     plt.xlabel('Steps')
@@ -208,11 +288,13 @@ def plot_3methods(simulation_parameters, info_list1, info_list2, info_list3, tot
     methods = (method1, method2, method3)
     plot_total_info_3methods(simulation_parameters, total_infos, methods)
 
-    var_info1, var_info2, var_info3 = np.var(info_list1, axis=0), np.var(info_list2, axis=0), np.var(info_list3, axis=0)
+    var_info1, var_info2, var_info3 = (_step_statistic(info_list1, 'variance')[1],
+                                       _step_statistic(info_list2, 'variance')[1],
+                                       _step_statistic(info_list3, 'variance')[1])
     plt.figure()
-    plt.plot(var_info1, label=method1)
-    plt.plot(var_info2, label=method2)
-    plt.plot(var_info3, label=method3)
+    plt.plot(steps1, var_info1, label=method1)
+    plt.plot(steps2, var_info2, label=method2)
+    plt.plot(steps3, var_info3, label=method3)
     plt.title('Variance of Information gained by method')
     plt.xlabel('Steps')
     plt.ylabel('Information')
@@ -221,11 +303,13 @@ def plot_3methods(simulation_parameters, info_list1, info_list2, info_list3, tot
     # plt.show()
     plt.close()
 
-    std_info1, std_info2, std_info3 = np.std(info_list1, axis=0), np.std(info_list2, axis=0), np.std(info_list3, axis=0)
+    std_info1, std_info2, std_info3 = (_step_statistic(info_list1, 'std')[1],
+                                       _step_statistic(info_list2, 'std')[1],
+                                       _step_statistic(info_list3, 'std')[1])
     plt.figure()
-    plt.plot(std_info1, label=method1)
-    plt.plot(std_info2, label=method2)
-    plt.plot(std_info3, label=method3)
+    plt.plot(steps1, std_info1, label=method1)
+    plt.plot(steps2, std_info2, label=method2)
+    plt.plot(steps3, std_info3, label=method3)
     plt.title('Standard Deviation of Information gained by method')
     plt.xlabel('Steps')
     plt.ylabel('Information')
@@ -235,6 +319,7 @@ def plot_3methods(simulation_parameters, info_list1, info_list2, info_list3, tot
     plt.close()
 
 
+@timed('plot.total_info_3methods')
 def plot_total_info_3methods(simulation_parameters, total_infos, methods):    
     n_clusters, n_nodes, _ = simulation_parameters
     dir_path = PLOTS_PATH + "3-methods/" + str(n_clusters) + "-clusters/"
@@ -252,6 +337,7 @@ def plot_total_info_3methods(simulation_parameters, total_infos, methods):
 
 
 
+@timed('plot.ars_by_steps_to_jump')
 def plot_ars_by_steps_to_jump(simulation_parameters, ars_steps_results_dict):
     n_clusters, n_nodes, n_tests = simulation_parameters
     dir_path = ARS_STEPS_PATH + str(n_clusters) + "-clusters/" + str(n_nodes) + "-nodes/"
@@ -260,7 +346,7 @@ def plot_ars_by_steps_to_jump(simulation_parameters, ars_steps_results_dict):
     os.makedirs(dir_path, exist_ok=True)
 
     for step, results in ars_steps_results_dict.items():
-        plt.plot(results, label=f'{step} steps')
+        plt.plot(*_curve(results), label=f'{step} steps')
 
     plt.title(f'ARS by Steps to Jump')
     plt.text(0, -0.2, f'Clusters: {n_clusters}, Nodes: {n_nodes}, Tests: {n_tests}', fontsize=SUBTEXT_FONT_SIZE,
@@ -270,79 +356,143 @@ def plot_ars_by_steps_to_jump(simulation_parameters, ars_steps_results_dict):
     plt.legend()
     plt.savefig(
         dir_path + f'{datetime.datetime.now().strftime("%Y%m%d%H%M%S")}_ars_steps_{n_clusters}_{n_nodes}_{n_tests}_.jpg')
-    plt.show()
+    _show()
 
 
-def plot_ars_by_steps_to_jump_and_perc_cl_info(simulation_parameters, ars_results, steps_to_plot):
+#
+#   Figures of an ARS sweep ({perc: {tau: curve}}), drawn with the Figure API
+#   on the Agg canvas instead of pyplot, so that they can be rendered in
+#   worker processes. A job is (draw function, path, arguments, savefig
+#   keyword arguments); the plot_* functions below render their jobs one
+#   after the other and render_ars_results renders all of them in a process
+#   pool. The curves are reduced to (x, y) arrays before becoming jobs.
+#
+
+
+def _draw_ars_taus(fig, simulation_parameters, perc, curves, legend=True):
     n_clusters, n_nodes, n_tests = simulation_parameters
-    dir_path = ARS_STEPS_PERC_CLUSTERS_PATH + str(n_clusters) + "-clusters/"
-    os.makedirs(dir_path, exist_ok=True)
-    dir_path = dir_path + str(n_nodes) + "-nodes/"
-    os.makedirs(dir_path, exist_ok=True)
-    for perc in ars_results.keys():
-        plt.figure()
-        for steps, results in ars_results[perc].items():
-            if steps in steps_to_plot:
-                plt.plot(results, label=f'Tau: {steps}')
-        plt.title(f'ARS: Multiple Tau and {perc*100}% of clusters with info')
-        plt.title(f'{perc*100}% of clusters with information')
-        plt.suptitle(f'Clusters: {n_clusters}, Nodes: {n_nodes}, Tests: {n_tests}')
-        plt.xlabel('Steps')
-        plt.ylabel('Information')
-        plt.legend()
-        plt.legend(loc='upper left', bbox_to_anchor=(1, 1))
-        save_path = dir_path + f'ARSTAU{int(perc * 1000)}.jpg'
-        plt.savefig(save_path, bbox_inches='tight')
-        plt.close()
+    ax = fig.subplots()
+    for tau, (x, y) in curves.items():
+        ax.plot(x, y, label=f'Tau: {tau}')
+    ax.set_title(f'{perc*100}% of clusters with information')
+    if legend:
+        fig.suptitle(f'Clusters: {n_clusters}, Nodes: {n_nodes}, Tests: {n_tests}')
+        ax.legend(loc='upper left', bbox_to_anchor=(1, 1))
+    ax.set_xlabel('Steps')
+    ax.set_ylabel('Information')
+
+
+def _draw_total_info(fig, simulation_parameters, perc, totals):
+    n_clusters, n_nodes, n_tests = simulation_parameters
+    ax = fig.subplots()
+    ax.plot(list(totals.keys()), list(totals.values()))
+    ax.set_title(f'Information gained in a graph with {perc*100}% of clusters with information')
+    fig.suptitle(f'Clusters: {n_clusters}, Nodes: {n_nodes}, Tests: {n_tests}')
+    ax.set_xlabel('Tau')
+    ax.set_ylabel('Total Information')
 
 
-def plot_ars_by_steps_to_jump_and_perc_cl_info_no_legend(simulation_parameters, ars_results, steps_to_plot):
+def _draw_all_percs(fig, simulation_parameters, totals_by_perc):
     n_clusters, n_nodes, n_tests = simulation_parameters
-    dir_path = ARS_STEPS_PERC_CLUSTERS_PATH + str(n_clusters) + "-clusters/"
-    os.makedirs(dir_path, exist_ok=True)
-    dir_path = dir_path + str(n_nodes) + "-nodes/"
-    os.makedirs(dir_path, exist_ok=True)
-    for perc in ars_results.keys():
-        plt.figure()
-        for steps, results in ars_results[perc].items():
-            if steps in steps_to_plot:
-                plt.plot(results)
-        plt.title(f'{perc*100}% of clusters with information')
-        plt.xlabel('Steps')
-        plt.ylabel('Information')
-        plt.legend().remove()
-        save_path = dir_path + f'ZARSTAU{int(perc * 1000)}.jpg'
-        plt.savefig(save_path, bbox_inches='tight')
-        plt.close()
+    ax = fig.subplots()
+    for perc, totals in totals_by_perc.items():
+        ax.plot(list(totals.keys()), list(totals.values()), label=f'{perc*100}%')
+    ax.set_title(f'Total Information gained by TAU and percentage of clusters with information')
+    fig.suptitle(f'Clusters: {n_clusters}, Nodes: {n_nodes}, Tests: {n_tests}')
+    ax.set_xlabel('Tau de ARS')
+    ax.set_ylabel('Información total')
+    ax.legend()
 
 
-def plot_total_information_gained_by_steps_and_perc_cl_info(simulation_parameters, ars_results):
+def _draw_optimal_tau(fig, simulation_parameters, optimum):
     n_clusters, n_nodes, n_tests = simulation_parameters
-    dir_path = ARS_STEPS_PERC_CLUSTERS_PATH + str(n_clusters) + "-clusters/" + str(n_nodes) + "-nodes/" + "total_info/"
+    fig.set_size_inches(12, 4.8)
+    tau_ax, curve_ax = fig.subplots(1, 2)
+    percs = list(optimum.keys())
+    tau_ax.plot([perc * 100 for perc in percs], [optimum[perc]['tau'] for perc in percs], marker='o')
+    tau_ax.set_xlabel('% of clusters with information')
+    tau_ax.set_ylabel('Optimal tau')
+    for perc, result in optimum.items():
+        stats = result['stats']
+        interval = stats.interval()
+        line, = curve_ax.plot(stats.index, stats.mean, label=f"{perc*100}%, tau {result['tau']}")
+        curve_ax.fill_between(stats.index, stats.mean - interval, stats.mean + interval, color=line.get_color(),
+                              alpha=0.3)
+    curve_ax.set_xlabel('Steps')
+    curve_ax.set_ylabel('Information')
+    curve_ax.legend()
+    fig.suptitle(f'ARS with the optimal tau. Clusters: {n_clusters}, Nodes: {n_nodes}, Tests: {n_tests}')
+
+
+def _render(job):
+    # draw and save one figure, without pyplot
+    draw, path, args, savefig_kwargs = job
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    draw(fig, *args)
+    fig.savefig(path, **savefig_kwargs)
+    return path
+
+
+def _ars_taus_dir(simulation_parameters):
+    n_clusters, n_nodes, _ = simulation_parameters
+    dir_path = ARS_STEPS_PERC_CLUSTERS_PATH + str(n_clusters) + "-clusters/" + str(n_nodes) + "-nodes/"
     os.makedirs(dir_path, exist_ok=True)
+    return dir_path
 
-    for perc in ars_results.keys():
-        plt.figure()
 
-        total_info_dict = {}
-        for steps, results in ars_results[perc].items():
-            total_info_dict[steps] = results[-1]
-
-        # Extract keys and values for plotting
-        x_values = list(total_info_dict.keys())
-        y_values = list(total_info_dict.values())
-        plt.plot(x_values, y_values)
-        # plt.scatter(x_values, y_values)
-        plt.title(f'Information gained in a graph with {perc*100}% of clusters with information')
-        # plt.title(f'{perc*100}% of clusters with information')
-        plt.suptitle(f'Clusters: {n_clusters}, Nodes: {n_nodes}, Tests: {n_tests}')
-        plt.xlabel('Tau')
-        plt.ylabel('Total Information')
-        save_path = dir_path + f'{int(perc * 1000)}TOTALINFO.jpg'
-        plt.savefig(save_path)
-        plt.close()
+def _total_info_dir(simulation_parameters):
+    dir_path = _ars_taus_dir(simulation_parameters) + "total_info/"
+    os.makedirs(dir_path, exist_ok=True)
+    return dir_path
+
+
+def _ars_taus_jobs(simulation_parameters, ars_results, steps_to_plot, legend=True):
+    dir_path = _ars_taus_dir(simulation_parameters)
+    prefix = 'ARSTAU' if legend else 'ZARSTAU'
+    jobs = []
+    for perc, results in ars_results.items():
+        curves = {tau: _curve(curve) for tau, curve in results.items() if tau in steps_to_plot}
+        jobs.append((_draw_ars_taus, dir_path + f'{prefix}{int(perc * 1000)}.jpg',
+                     (simulation_parameters, perc, curves, legend), {'bbox_inches': 'tight'}))
+    return jobs
+
+
+def _totals(ars_results):
+    # {perc: {tau: final information}}
+    return {perc: {tau: _final(curve) for tau, curve in results.items()} for perc, results in ars_results.items()}
+
+
+def _total_info_jobs(simulation_parameters, ars_results):
+    dir_path = _total_info_dir(simulation_parameters)
+    return [(_draw_total_info, dir_path + f'{int(perc * 1000)}TOTALINFO.jpg', (simulation_parameters, perc, totals), {})
+            for perc, totals in _totals(ars_results).items()]
+
+
+def _all_percs_jobs(simulation_parameters, ars_results):
+    dir_path = _total_info_dir(simulation_parameters)
+    return [(_draw_all_percs, dir_path + 'ALLINONE.jpg', (simulation_parameters, _totals(ars_results)), {})]
 
 
+@timed('plot.ars_by_steps_to_jump_and_perc_cl_info')
+def plot_ars_by_steps_to_jump_and_perc_cl_info(simulation_parameters, ars_results, steps_to_plot):
+    for job in _ars_taus_jobs(simulation_parameters, ars_results, steps_to_plot):
+        _render(job)
+
+
+@timed('plot.ars_by_steps_to_jump_and_perc_cl_info_no_legend')
+def plot_ars_by_steps_to_jump_and_perc_cl_info_no_legend(simulation_parameters, ars_results, steps_to_plot):
+    for job in _ars_taus_jobs(simulation_parameters, ars_results, steps_to_plot, legend=False):
+        _render(job)
+
+
+@timed('plot.total_information_gained_by_steps_and_perc_cl_info')
+def plot_total_information_gained_by_steps_and_perc_cl_info(simulation_parameters, ars_results):
+    for job in _total_info_jobs(simulation_parameters, ars_results):
+        _render(job)
+
+
+@timed('plot.info_by_steps_and_steps_taken')
 def plot_info_by_steps_and_steps_taken(simulation_parameters, ars_results):
     n_clusters, n_nodes, n_tests = simulation_parameters
     dir_path = ARS_STEPS_PATH + str(n_clusters) + "-clusters/" + str(n_nodes) + "-nodes/" + "info_by_steps/"
@@ -354,24 +504,66 @@ def plot_info_by_steps_and_steps_taken(simulation_parameters, ars_results):
         info = list(ars_results[perc].values())
 
 
+@timed('plot.all_percs_in_one')
 def plot_all_percs_in_one(simulation_parameters, ars_results):
-    n_clusters, n_nodes, n_tests = simulation_parameters
-    dir_path = ARS_STEPS_PERC_CLUSTERS_PATH + str(n_clusters) + "-clusters/" + str(n_nodes) + "-nodes/" + "total_info/"
-    os.makedirs(dir_path, exist_ok=True)
-    
-    plt.figure()
-    total_info_dict = {}
-    for perc in ars_results.keys():
-        for steps, results in ars_results[perc].items():
-            total_info_dict[steps] = results[-1]
-        x_values = list(total_info_dict.keys())
-        y_values = list(total_info_dict.values())
-        plt.plot(x_values, y_values, label=f'{perc*100}%')
-    plt.title(f'Total Information gained by TAU and percentage of clusters with information')
-    plt.suptitle(f'Clusters: {n_clusters}, Nodes: {n_nodes}, Tests: {n_tests}')
-    plt.xlabel('Tau de ARS')
-    plt.ylabel('Información total')
-    plt.legend()
-    save_path = dir_path + f'ALLINONE.jpg'
-    plt.savefig(save_path)
-    plt.close()
+    for job in _all_percs_jobs(simulation_parameters, ars_results):
+        _render(job)
+
+
+@timed('plot.render_ars_results')
+def render_ars_results(simulation_parameters, ars_results, steps_to_plot=None, max_workers=None) -> list:
+    """
+    Write every figure of an ARS sweep in parallel: the ARSTAU, ZARSTAU, TOTALINFO
+    and ALLINONE files of the four plot_* functions above. Nothing is displayed.
+
+    Args:
+        simulation_parameters (list): [n_clusters, n_nodes, n_tests].
+        ars_results (dict): {perc: {tau: curve or RunStats}}, as returned by sweep.run_sweep.
+        steps_to_plot (list): Taus drawn in the ARSTAU / ZARSTAU figures, all of them by default.
+        max_workers (int): Worker processes, os.cpu_count() by default; 1 renders in this process.
+
+    Returns:
+        list: Paths of the written figures.
+    """
+    if steps_to_plot is None:
+        steps_to_plot = sorted({tau for results in ars_results.values() for tau in results})
+    jobs = (_ars_taus_jobs(simulation_parameters, ars_results, steps_to_plot)
+            + _ars_taus_jobs(simulation_parameters, ars_results, steps_to_plot, legend=False)
+            + _total_info_jobs(simulation_parameters, ars_results)
+            + _all_percs_jobs(simulation_parameters, ars_results))
+
+    if max_workers == 1:
+        return [_render(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(_render, jobs))
+
+
+@timed('plot.optimal_tau')
+def plot_optimal_tau(simulation_parameters, optimum):
+    """
+    Optimal tau of each coverage level and the mean curve of that tau with its confidence band,
+    from the result of tau_search.optimize_tau, saved to OPTIMALTAU.jpg.
+    """
+    path = _ars_taus_dir(simulation_parameters) + 'OPTIMALTAU.jpg'
+    return _render((_draw_optimal_tau, path, (simulation_parameters, optimum), {'bbox_inches': 'tight'}))
+
+
+def render_stored_results(store, graph, seed, method='ars', steps_to_plot=None, max_workers=None) -> list:
+    """
+    render_ars_results of a sweep saved in a ResultsStore by sweep.run_sweep, without running it again.
+
+    Args:
+        store (ResultsStore): The store.
+        graph (str): Key of the graph in the store.
+        seed (int): Seed of the sweep.
+        method (str): Method of the sweep.
+        steps_to_plot (list): Taus drawn in the ARSTAU / ZARSTAU figures, all of them by default.
+        max_workers (int): Worker processes, os.cpu_count() by default; 1 renders in this process.
+
+    Returns:
+        list: Paths of the written figures.
+    """
+    metadata = store.metadata(graph, seed, method)
+    simulation_parameters = [metadata['n_clusters'], metadata['n_nodes'], metadata['n_tests']]
+    ars_results = store.load_results(graph, seed, method, metadata['n_tests'])
+    return render_ars_results(simulation_parameters, ars_results, steps_to_plot, max_workers)
@@ -0,0 +1,140 @@
+import json
+import os
+import re
+import tempfile
+
+import numpy as np
+
+from stats import RunStats
+
+#
+#   On-disk store of sweep results, written as the cells finish so that an
+#   interrupted sweep loses at most the cells that were running. A cell is
+#   (graph, seed, method, tau, perc) and its results are chunks, one .npz
+#   file per batch of tests:
+#
+#       results/<graph>/seed<seed>/<method>/tau<tau>/perc<perc * 1000>/tests<first>-<stop>.npz
+#
+#   graph is a key of the graph (its graph_hash by default), seed the seed of
+#   the sweep and tests first..stop-1 the test indices of the batch. A chunk
+#   holds the RunStats of its curves (see RunStats.to_dict); loading a cell
+#   merges its chunks. Chunks are written to a temporary file and renamed,
+#   so a crash never leaves half a chunk. The <method> directory of a sweep
+#   also keeps a metadata.json with its parameters.
+#
+
+RESULTS_PATH = 'results/'
+
+_CHUNK = re.compile(r'tests(\d+)-(\d+)\.npz$')
+
+
+class ResultsStore:
+    """
+    Directory of sweep results.
+
+    Args:
+        path (str): Root directory of the store.
+        every (int): Keep one step out of every in the saved statistics.
+        capacity (int): Curves kept per chunk for the quantiles.
+    """
+
+    def __init__(self, path=RESULTS_PATH, every=1, capacity=32):
+        self.path = path
+        self.every = every
+        self.capacity = capacity
+
+    def _sweep_dir(self, graph, seed, method):
+        return os.path.join(self.path, str(graph), f'seed{seed}', method)
+
+    def _cell_dir(self, graph, seed, method, tau, perc):
+        return os.path.join(self._sweep_dir(graph, seed, method), f'tau{tau}', f'perc{int(round(perc * 1000))}')
+
+    def has_sweep(self, graph, seed, method) -> bool:
+        return os.path.exists(os.path.join(self._sweep_dir(graph, seed, method), 'metadata.json'))
+
+    def save_metadata(self, graph, seed, method, metadata: dict):
+        os.makedirs(self._sweep_dir(graph, seed, method), exist_ok=True)
+        with open(os.path.join(self._sweep_dir(graph, seed, method), 'metadata.json'), 'w') as f:
+            json.dump(metadata, f)
+
+    def metadata(self, graph, seed, method) -> dict:
+        with open(os.path.join(self._sweep_dir(graph, seed, method), 'metadata.json')) as f:
+            return json.load(f)
+
+    def save(self, graph, seed, method, tau, perc, first_test, stats: RunStats):
+        """
+        Save the statistics of the tests first_test..first_test + stats.n - 1 of a cell.
+        """
+        cell_dir = self._cell_dir(graph, seed, method, tau, perc)
+        os.makedirs(cell_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cell_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, **stats.to_dict())
+        os.replace(tmp_path, os.path.join(cell_dir, f'tests{first_test}-{first_test + stats.n}.npz'))
+
+    def chunks(self, graph, seed, method, tau, perc) -> list:
+        """
+        (first, stop) test ranges of the saved chunks of a cell, sorted.
+        """
+        cell_dir = self._cell_dir(graph, seed, method, tau, perc)
+        if not os.path.isdir(cell_dir):
+            return []
+        matches = (_CHUNK.match(name) for name in os.listdir(cell_dir))
+        return sorted((int(m.group(1)), int(m.group(2))) for m in matches if m is not None)
+
+    def _chain(self, graph, seed, method, tau, perc, n_tests=None) -> list:
+        # chunks that follow each other from test 0, until they hold at least n_tests tests
+        chain, done = [], 0
+        for first, stop in self.chunks(graph, seed, method, tau, perc):
+            if n_tests is not None and done >= n_tests:
+                break
+            if first == done:
+                chain.append((first, stop))
+                done = stop
+        return chain
+
+    def n_tests(self, graph, seed, method, tau, perc) -> int:
+        """
+        Number of tests saved for a cell without gaps from test 0.
+        """
+        chain = self._chain(graph, seed, method, tau, perc)
+        return chain[-1][1] if chain else 0
+
+    def load(self, graph, seed, method, tau, perc, n_tests=None, rng=None):
+        """
+        Merged statistics of the chunks of a cell, or None if it has none.
+
+        Args:
+            n_tests (int): Only merge the chunks up to the one that reaches n_tests tests (all of them
+                by default); chunks are not split, so the statistics may hold more than n_tests tests.
+            rng (np.random.Generator | int): Random generator of the merged quantile sketch.
+
+        Returns:
+            RunStats | None: The statistics of the cell.
+        """
+        cell_dir = self._cell_dir(graph, seed, method, tau, perc)
+        stats = None
+        for first, stop in self._chain(graph, seed, method, tau, perc, n_tests):
+            with np.load(os.path.join(cell_dir, f'tests{first}-{stop}.npz')) as arrays:
+                chunk = RunStats.from_dict(arrays, rng)
+            stats = chunk if stats is None else stats.merge(chunk)
+        return stats
+
+    def load_results(self, graph, seed, method='ars', n_tests=None) -> dict:
+        """
+        Every saved cell of a sweep, in the form the plotter functions take.
+
+        Returns:
+            dict: {perc: {tau: RunStats}}, percs and taus in increasing order.
+        """
+        method_dir = self._sweep_dir(graph, seed, method)
+        results = {}
+        for tau_name in os.listdir(method_dir) if os.path.isdir(method_dir) else []:
+            if not tau_name.startswith('tau'):
+                continue
+            for perc_name in os.listdir(os.path.join(method_dir, tau_name)):
+                tau, perc = int(tau_name[len('tau'):]), int(perc_name[len('perc'):]) / 1000
+                stats = self.load(graph, seed, method, tau, perc, n_tests)
+                if stats is not None:
+                    results.setdefault(perc, {})[tau] = stats
+        return {perc: dict(sorted(results[perc].items())) for perc in sorted(results)}
@@ -0,0 +1,81 @@
+import networkx as nx
+import numpy as np
+
+from csr_graph import csr_from_edges
+
+#
+#   Sampling primitives of the walks. None of them retries: "any node but
+#   the current one" draws an index among n - 1 and shifts it past the current
+#   node, and "any neighbour" indexes the neighbour slice of the node in CSR
+#   arrays, which have no self loops. Each draw is O(1) whatever the shape of
+#   the graph. The walks of walking.py draw from the same arrays, built once
+#   per networkx graph by neighbor_arrays.
+#
+#   Nodes without neighbours are reported explicitly (None / a mask) and the
+#   walks decide what to do with them: the random and PageRank walks jump to
+#   another node, ARS jumps as if tau had been reached.
+#
+
+
+def other_index(n, k, u) -> int:
+    """
+    Uniform index in 0..n-1 other than k, from a uniform draw u in [0, 1).
+    """
+    if n < 2:
+        raise Exception("the graph must have at least two nodes to jump")
+    index = int(u * (n - 1))
+    return index + 1 if index >= k else index
+
+
+def other_indices(n, k, u) -> np.ndarray:
+    """
+    Vectorized other_index: one index other than k[i] for every draw u[i].
+    """
+    if n < 2:
+        raise Exception("the graph must have at least two nodes to jump")
+    indices = (u * (n - 1)).astype(np.int64)
+    return indices + (indices >= k)
+
+
+def neighbor_arrays(G: nx.Graph) -> tuple:
+    """
+    Neighbour lists of G as CSR arrays over the positions of G.nodes, without self loops,
+    in the order of csr_from_graph. They are built once and kept in G.graph['neighbor_arrays'],
+    and built again when nodes or edges have been added or removed.
+
+    Returns:
+        tuple: (nodes, offsets, indices), nodes[k] being the id of the node at position k.
+    """
+    size = (G.number_of_nodes(), G.number_of_edges())
+    cached = G.graph.get('neighbor_arrays')
+    if cached is None or cached[0] != size:
+        nodes = list(G.nodes)
+        index = {node: k for k, node in enumerate(nodes)}
+        C = csr_from_edges(len(nodes), [(index[u], index[v]) for u, v in G.edges])
+        cached = (size, nodes, C.offsets, C.indices)
+        G.graph['neighbor_arrays'] = cached
+    return cached[1:]
+
+
+def csr_neighbor(offsets, indices, k, u):
+    """
+    Uniform neighbour of node k of a CSR graph from a draw u in [0, 1), or -1 if k has none.
+    """
+    start = offsets[k]
+    degree = offsets[k + 1] - start
+    if degree == 0:
+        return -1
+    return indices[start + int(u * degree)]
+
+
+def csr_neighbors(offsets, indices, k, u):
+    """
+    Vectorized csr_neighbor. Returns the neighbours and a mask of the nodes
+    without neighbours, whose entries in the first array are meaningless.
+    """
+    start = offsets[k]
+    degree = offsets[k + 1] - start
+    if len(indices) == 0:
+        return np.zeros_like(k), degree == 0
+    pick = np.minimum(start + (u * degree).astype(np.int64), len(indices) - 1)
+    return indices[pick], degree == 0
@@ -0,0 +1,53 @@
+import numpy as np
+
+#
+#   Random streams. Every generator and walk takes an rng argument that may be
+#   None (fresh entropy), an int seed, a SeedSequence or a numpy Generator, and
+#   turns it into a Generator with make_rng. Independent streams for parallel
+#   workers or for the tests of an experiment are spawned from one root seed,
+#   so a run is reproducible no matter how its work is split.
+#
+
+
+def make_rng(seed=None) -> np.random.Generator:
+    """
+    Generator for a seed, SeedSequence or Generator (returned unchanged).
+    """
+    return np.random.default_rng(seed)
+
+
+def spawn_seeds(seed, n) -> list:
+    """
+    Spawn n independent SeedSequences from a root seed.
+
+    Args:
+        seed (int | np.random.SeedSequence | np.random.Generator | None): Root of the streams.
+        n (int): Number of streams.
+
+    Returns:
+        list: n SeedSequences, picklable, to hand to worker processes.
+    """
+    if isinstance(seed, np.random.Generator):
+        seed = seed.bit_generator.seed_seq
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return seed.spawn(n)
+
+
+def spawn_rngs(seed, n) -> list:
+    """
+    Spawn n independent Generators from a root seed, e.g. one per test.
+    """
+    return [np.random.default_rng(seed_seq) for seed_seq in spawn_seeds(seed, n)]
+
+
+def batch_seed(seed_seq, first) -> np.random.SeedSequence:
+    """
+    Seed of the batch of tests that starts at test first of a stream: the stream
+    itself for the first batch, an independent child of it for the others. A
+    batch rerun from the same first test gets the same seed, but tests run as
+    several batches draw other numbers than the same tests run as one batch.
+    """
+    if first == 0:
+        return seed_seq
+    return np.random.SeedSequence(seed_seq.entropy, spawn_key=seed_seq.spawn_key + (first,))
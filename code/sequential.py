@@ -0,0 +1,140 @@
+import networkx as nx
+import numpy as np
+
+import instrumentation
+
+from csr_graph import CSRGraph, csr_from_graph
+from information import InformationState
+from seeding import batch_seed, make_rng, spawn_rngs, spawn_seeds
+from stats import RunStats
+from walk_kernels import walk_compiled
+
+#
+#   Sequential stopping: instead of a fixed number of tests, a configuration
+#   runs batches of tests until the confidence interval of its mean curve is
+#   narrow enough. After each batch the half-widths of the intervals (see
+#   RunStats.interval) of the final information and of every step are
+#   compared with the tolerances, in information units; the configuration
+#   stops when both are met, or after max_tests tests. The number of tests
+#   used is the n of the returned RunStats.
+#
+#   The walk is one of the walks of walking.py (random_walk, ars_walk,
+#   pagerank_walk), run test after test on the networkx graph, or a method
+#   name ('random', 'ars', 'pagerank') run with walk_compiled on the
+#   compiled graph. The batch starting at test k has its own random stream
+#   (seeding.batch_seed), so a configuration is reproducible given its seed
+#   and batch size.
+#
+
+
+def _nx_batches(G: nx.Graph, walk, steps, batch_size, walk_kwargs):
+    # run_batch(n, seed_seq) of a walking.py walk, one walker of a shared state per test
+    state = InformationState.from_graph(G, batch_size)
+
+    def run_batch(n, seed_seq):
+        state.reset()
+        info_steps = np.empty((n, steps))
+        for k, rng in enumerate(spawn_rngs(seed_seq, n)):
+            walk(G, k, steps, state=state, rng=rng, out=info_steps[k], **walk_kwargs)
+        return info_steps
+
+    return run_batch
+
+
+def _compiled_batches(C: CSRGraph, method, steps, walk_kwargs):
+    # run_batch(n, seed_seq) of walk_compiled
+    states = {}
+
+    def run_batch(n, seed_seq):
+        if n not in states:
+            states[n] = InformationState(C.information, n)
+        states[n].reset()
+        return walk_compiled(C, method, n, steps, information=states[n], rng=make_rng(seed_seq), **walk_kwargs)
+
+    return run_batch
+
+
+def converged(stats: RunStats, tolerance, step_tolerance=None, confidence=0.95) -> bool:
+    """
+    Whether the confidence intervals of the final information and of every step of the mean
+    curve are narrower than tolerance and step_tolerance (tolerance by default), as half-widths.
+    """
+    interval = stats.interval(confidence)
+    step_tolerance = tolerance if step_tolerance is None else step_tolerance
+    return bool(interval[-1] <= tolerance and interval.max() <= step_tolerance)
+
+
+@instrumentation.timed('run_until_converged')
+def run_until_converged(G, walk, steps=10, tolerance=1.0, step_tolerance=None, batch_size=20, min_tests=40,
+                        max_tests=1000, confidence=0.95, every=1, seed=None, **walk_kwargs) -> RunStats:
+    """
+    Run tests of a walk in batches until its mean curve is known within tolerance.
+
+    Args:
+        G (nx.Graph | CSRGraph): Graph with information; a CSRGraph only with a method name.
+        walk (callable | str): random_walk, ars_walk or pagerank_walk, or 'random', 'ars' or 'pagerank'.
+        steps (int): Steps of each walk.
+        tolerance (float): Half-width of the confidence interval of the final information to reach.
+        step_tolerance (float): Half-width to reach at every step, tolerance by default.
+        batch_size (int): Tests between two checks.
+        min_tests (int): Tests run before the first check.
+        max_tests (int): Tests after which the configuration stops anyway.
+        confidence (float): Level of the confidence intervals.
+        every (int): Keep (and check) the statistics of one step out of every.
+        seed (int): Seed of the configuration.
+        **walk_kwargs: Other arguments of the walk, e.g. tau=5 for ARS.
+
+    Returns:
+        RunStats: Statistics of the curves; stats.n is the number of tests used.
+    """
+    if isinstance(walk, str):
+        C = csr_from_graph(G) if isinstance(G, nx.Graph) else G
+        run_batch = _compiled_batches(C, walk, steps, walk_kwargs)
+    elif isinstance(G, nx.Graph):
+        run_batch = _nx_batches(G, walk, steps, batch_size, walk_kwargs)
+    else:
+        raise Exception("the walks of walking.py need a networkx graph")
+
+    walk_seed, stats_seed = spawn_seeds(seed, 2)
+    stats = RunStats(steps, every, rng=make_rng(stats_seed))
+    while stats.n < max_tests:
+        n = min(batch_size, max_tests - stats.n)
+        stats.add_batch(run_batch(n, batch_seed(walk_seed, stats.n)))
+        if stats.n >= min_tests and converged(stats, tolerance, step_tolerance, confidence):
+            break
+    instrumentation.count('sequential.tests', stats.n)
+    return stats
+
+
+def run_configurations(G, configurations: dict, steps=10, seed=None, **kwargs) -> dict:
+    """
+    run_until_converged of several configurations, each with an independent stream.
+
+    Args:
+        G (nx.Graph | CSRGraph): The graph.
+        configurations (dict): {name: walk arguments}, e.g. {'ARS tau 5': {'walk': ars_walk, 'tau': 5}}.
+        steps (int): Steps of each walk.
+        seed (int): Seed of the experiment.
+        **kwargs: Stopping arguments of run_until_converged (tolerance, max_tests, ...).
+
+    Returns:
+        dict: {name: RunStats}.
+    """
+    seeds = spawn_seeds(seed, len(configurations))
+    return {name: run_until_converged(G, steps=steps, seed=seed_seq, **kwargs, **arguments)
+            for (name, arguments), seed_seq in zip(configurations.items(), seeds)}
+
+
+def report(results: dict, tolerance=None, step_tolerance=None, confidence=0.95) -> str:
+    """
+    Table of the tests used by each configuration of run_configurations and of its intervals,
+    marking the ones that stopped at max_tests before reaching the tolerances, if given.
+    """
+    lines = [f"{'configuration':<30} {'tests':>7} {'final info':>12} {'final CI':>10} {'max step CI':>12}"]
+    for name, stats in results.items():
+        interval = stats.interval(confidence)
+        line = f'{name:<30} {stats.n:>7} {stats.mean[-1]:>12.3f} {interval[-1]:>10.3f} {interval.max():>12.3f}'
+        if tolerance is not None and not converged(stats, tolerance, step_tolerance, confidence):
+            line += '  (not converged)'
+        lines.append(line)
+    return '\n'.join(lines)
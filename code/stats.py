@@ -0,0 +1,177 @@
+import numpy as np
+from scipy.stats import norm
+
+from seeding import make_rng
+
+#
+#   Streaming per-step statistics of many walks. Instead of keeping every
+#   info_steps curve until np.mean / np.var reduce them, each curve (or batch
+#   of curves) is folded into running moments as soon as it is produced
+#   (Welford's update, Chan's formula for batches), so the memory used is
+#   O(steps) whatever the number of tests. With every=k only one step out of
+#   k is kept (plus the last one), which bounds the memory for very long walks.
+#
+#   Besides the moments, a RunStats tracks the per-step minimum and maximum
+#   and, on request (capacity > 0), a quantile sketch: a uniform reservoir
+#   sample of at most `capacity` curves, exact while fewer curves have been
+#   added. The sketch only keeps the curves at `points` evenly spaced steps,
+#   so it takes capacity * points values however long the walks are. RunStats
+#   built in different processes (with the same steps, every and points) can
+#   be merged.
+#
+
+
+class RunStats:
+    """
+    Running statistics of info_steps curves, step by step.
+
+    Args:
+        steps (int): Length of the curves.
+        every (int): Keep one step out of every (the last step is always kept).
+        capacity (int): Curves kept by the quantile sketch, 0 (the default) for no sketch.
+        points (int): Steps of index kept by the quantile sketch.
+        rng (np.random.Generator | int): Random generator or seed of the sketch.
+
+    Attributes:
+        index (np.ndarray): Steps (0-based) whose statistics are kept.
+        sketch_index (np.ndarray): Steps (0-based) of the quantile sketch.
+        n (int): Number of curves added.
+        min (np.ndarray): Per-step minimum.
+        max (np.ndarray): Per-step maximum.
+    """
+
+    def __init__(self, steps, every=1, capacity=0, points=64, rng=None):
+        self.steps = steps
+        self.every = every
+        self.capacity = capacity
+        self.points = points
+        self.index = np.unique(np.append(np.arange(every - 1, steps, every), steps - 1))
+        self._sketch = np.unique(np.linspace(0, len(self.index) - 1, min(points, len(self.index))).round().astype(int))
+        self.sketch_index = self.index[self._sketch]
+        self.n = 0
+        self._mean = np.zeros(len(self.index))
+        self._m2 = np.zeros(len(self.index))
+        self.min = np.full(len(self.index), np.inf)
+        self.max = np.full(len(self.index), -np.inf)
+        self._reservoir = np.empty((capacity, len(self._sketch)))
+        self._rng = make_rng(rng)
+
+    def add(self, info_steps):
+        """
+        Add one curve, of length steps (or already reduced to the kept steps).
+        """
+        self.add_batch(np.asarray(info_steps, dtype=np.float64)[np.newaxis])
+
+    def add_batch(self, info_steps):
+        """
+        Add a (n_curves, steps) matrix of curves, e.g. the result of walk_batch.
+        """
+        x = self._checkpoints(np.asarray(info_steps, dtype=np.float64))
+        if len(x) == 0:
+            return
+        for seen, row in enumerate(x[:, self._sketch] if self.capacity else [], self.n):
+            self._sample(row, seen)
+        mean = x.mean(axis=0)
+        self._combine(len(x), mean, ((x - mean) ** 2).sum(axis=0))
+        np.minimum(self.min, x.min(axis=0), out=self.min)
+        np.maximum(self.max, x.max(axis=0), out=self.max)
+
+    def merge(self, other):
+        """
+        Add the curves accumulated by another RunStats (e.g. from a worker process).
+        """
+        if not (np.array_equal(self.index, other.index) and np.array_equal(self.sketch_index, other.sketch_index)):
+            raise Exception("cannot merge statistics kept at different steps")
+        if other.n == 0:
+            return self
+
+        if self.capacity:
+            self._merge_sample(other)
+        self._combine(other.n, other._mean, other._m2)
+        np.minimum(self.min, other.min, out=self.min)
+        np.maximum(self.max, other.max, out=self.max)
+        return self
+
+    def to_dict(self) -> dict:
+        """
+        Arrays of the statistics (the reservoir cut to the curves it holds), for np.savez.
+        """
+        return {'steps': self.steps, 'every': self.every, 'capacity': self.capacity, 'points': self.points,
+                'n': self.n, 'mean': self._mean, 'm2': self._m2, 'min': self.min, 'max': self.max,
+                'reservoir': self._reservoir[:min(self.n, self.capacity)]}
+
+    @classmethod
+    def from_dict(cls, arrays, rng=None):
+        """
+        RunStats saved with to_dict (a dict or a loaded .npz file).
+        """
+        stats = cls(int(arrays['steps']), int(arrays['every']), int(arrays['capacity']), int(arrays['points']), rng)
+        stats.n = int(arrays['n'])
+        stats._mean = np.array(arrays['mean'], dtype=np.float64)
+        stats._m2 = np.array(arrays['m2'], dtype=np.float64)
+        stats.min = np.array(arrays['min'], dtype=np.float64)
+        stats.max = np.array(arrays['max'], dtype=np.float64)
+        reservoir = np.asarray(arrays['reservoir'])
+        stats._reservoir[:len(reservoir)] = reservoir
+        return stats
+
+    def _checkpoints(self, x):
+        return x if x.shape[-1] == len(self.index) else x[..., self.index]
+
+    def _merge_sample(self, other):
+        kept, other_kept = min(self.n, self.capacity), min(other.n, other.capacity)
+        total = self.n + other.n
+        # each slot of the merged sample comes from either side in proportion to its curves
+        from_other = self._rng.hypergeometric(other.n, self.n, min(total, self.capacity)) if self.n else other_kept
+        from_other = min(from_other, other_kept)
+        from_self = min(min(total, self.capacity) - from_other, kept)
+        reservoir = np.concatenate((
+            self._reservoir[self._rng.choice(kept, from_self, replace=False)],
+            other._reservoir[self._rng.choice(other_kept, from_other, replace=False)],
+        ))
+        self._reservoir[:len(reservoir)] = reservoir
+
+    def _sample(self, row, seen):
+        # reservoir sampling (algorithm R): row is curve number seen (0-based)
+        if seen < self.capacity:
+            self._reservoir[seen] = row
+        else:
+            slot = self._rng.integers(seen + 1)
+            if slot < self.capacity:
+                self._reservoir[slot] = row
+
+    def _combine(self, n, mean, m2):
+        total = self.n + n
+        delta = mean - self._mean
+        self._mean = self._mean + delta * n / total
+        self._m2 = self._m2 + m2 + delta ** 2 * self.n * n / total
+        self.n = total
+
+    @property
+    def mean(self) -> np.ndarray:
+        return self._mean.copy()
+
+    @property
+    def variance(self) -> np.ndarray:
+        # population variance, as np.var(info_list, axis=0)
+        return self._m2 / self.n if self.n else np.zeros(len(self.index))
+
+    @property
+    def std(self) -> np.ndarray:
+        return np.sqrt(self.variance)
+
+    def interval(self, confidence=0.95) -> np.ndarray:
+        """
+        Per-step half-width of the normal confidence interval of the mean.
+        """
+        if self.n < 2:
+            return np.full(len(self.index), np.inf)
+        return norm.ppf(0.5 + confidence / 2) * np.sqrt(self._m2 / (self.n - 1) / self.n)
+
+    def quantile(self, q) -> np.ndarray:
+        """
+        Quantile(s) q of the curves at the steps of sketch_index, from the reservoir sample.
+        """
+        if self.capacity == 0:
+            raise Exception("these statistics keep no quantile sketch, build them with capacity > 0")
+        return np.quantile(self._reservoir[:min(self.n, self.capacity)], q, axis=0)
@@ -0,0 +1,204 @@
+import networkx as nx
+import numpy as np
+import instrumentation
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from csr_graph import CSRGraph, csr_from_graph, graph_hash
+from walk_kernels import walk_compiled
+from graph import truncate_float
+from graph_cache import load_graph
+from information import InformationState
+from seeding import batch_seed, make_rng, spawn_seeds
+from stats import RunStats
+
+#
+#   Parallel tau x coverage sweeps. The graph is compiled once and handed to
+#   every worker process through the pool initializer, so it is pickled once
+#   per worker instead of once per cell. A graph saved with save_graph is not
+#   pickled at all: the workers memory-map the same files. Each cell (perc,
+#   tau) runs n_tests walks (compiled when numba is available, see
+#   walk_kernels) and only its mean curve travels back to the parent. A worker
+#   keeps one InformationState per coverage level and resets it between cells.
+#   While an instrumentation run is open, each worker records its cells and
+#   sends the timers and counters back with the curve.
+#
+#   Given a ResultsStore, the workers send back the RunStats of each cell
+#   instead, and the parent saves it as soon as it arrives. A restarted sweep
+#   only runs the tests its cells are missing in the store. Cells run whole,
+#   so resuming a sweep after a crash reproduces an uninterrupted one. Raising
+#   n_tests runs the extra tests of each cell as a new batch with its own
+#   stream (see seeding.batch_seed): the results are as valid but differ from
+#   a single run with the larger n_tests. The streams and the information of
+#   a cell depend on the whole grid, so a sweep only resumes one with the
+#   same parameters.
+#
+
+_WORKER_GRAPH = None
+_WORKER_INFORMATION = None
+_WORKER_STATES = {}
+
+
+def _init_worker(graph, information_by_perc):
+    # graph is the path of a saved graph or its (offsets, indices) arrays
+    global _WORKER_GRAPH, _WORKER_INFORMATION
+    _WORKER_GRAPH = load_graph(graph)[0] if isinstance(graph, str) else CSRGraph(*graph)
+    _WORKER_INFORMATION = information_by_perc
+    _WORKER_STATES.clear()
+
+
+def _run_cell(perc, tau, method, n_tests, steps, seed_seq, instrument=False, keep=None):
+    # keep=(every, capacity) returns the RunStats of the curves instead of their mean
+    if instrument:
+        with instrumentation.record('cell') as run:
+            perc, tau, result, _ = _run_cell(perc, tau, method, n_tests, steps, seed_seq, keep=keep)
+        run.timers['sweep.cell'] = run.timers.pop('total')
+        return perc, tau, result, run.to_dict()
+
+    rng = make_rng(seed_seq)
+    state = _WORKER_STATES.get((perc, n_tests))
+    if state is None:
+        state = InformationState(_WORKER_INFORMATION[perc], n_tests)
+        _WORKER_STATES[(perc, n_tests)] = state
+    else:
+        state.reset()
+    info_steps = walk_compiled(_WORKER_GRAPH, method, n_tests, steps, tau, state, rng)
+    if keep is not None:
+        with instrumentation.timer('sweep.stats'):
+            stats = RunStats(steps, *keep, rng=rng)
+            stats.add_batch(info_steps)
+        return perc, tau, stats, None
+    with instrumentation.timer('sweep.mean'):
+        mean_curve = np.mean(info_steps, axis=0)
+    return perc, tau, mean_curve, None
+
+
+@instrumentation.timed('coverage_information')
+def coverage_information(C: CSRGraph, perc_cl_info, rng=None) -> dict:
+    """
+    Draw the information vector of every coverage level of a sweep.
+
+    Clusters are selected as graph_add_information does across consecutive
+    calls: each level keeps the clusters of the previous one and adds enough
+    new clusters to reach its percentage (all of them when perc is 1).
+
+    Args:
+        C (CSRGraph): Compiled graph, with cluster labels.
+        perc_cl_info (list): Fractions of clusters with information, in increasing order.
+        rng (np.random.Generator | int): Random generator or seed.
+
+    Returns:
+        dict: {perc: information vector}.
+    """
+    if C.cluster_index is None:
+        raise Exception("the graph has no cluster labels")
+
+    rng = make_rng(rng)
+    cluster_ids = C.cluster_index.labels
+    node_clusters = C.cluster_index.node_labels()
+    n_clusters = len(cluster_ids)
+
+    information_by_perc = {}
+    clusters_with_info = np.empty(0, dtype=np.int64)
+    previous_perc = 0
+    for perc in perc_cl_info:
+        perc_to_add = round(perc - truncate_float(previous_perc, 2), 2)
+        selectable = np.setdiff1d(cluster_ids, clusters_with_info)
+        new_clusters = rng.choice(selectable, int(n_clusters * perc_to_add), replace=False)
+        clusters_with_info = np.concatenate((clusters_with_info, new_clusters))
+        if perc == 1:
+            clusters_with_info = cluster_ids
+
+        has_info = np.isin(node_clusters, clusters_with_info)
+        information_by_perc[perc] = np.where(has_info, rng.random(C.n_nodes), 0.0)
+        previous_perc = perc
+
+    return information_by_perc
+
+
+@instrumentation.timed('run_sweep')
+def run_sweep(G, perc_cl_info, taus, method='ars', n_tests=100, steps=None, seed=None,
+              max_workers=None, store=None, graph_key=None) -> dict:
+    """
+    Run a tau x coverage sweep across a pool of worker processes.
+
+    Args:
+        G (nx.Graph | CSRGraph | str): Graph from graph_erdos / graph_with_clusters, its compiled
+            form, or the directory of a graph saved with save_graph.
+        perc_cl_info (list): Fractions of clusters with information, in increasing order.
+        taus (list): Tau values to evaluate (ignored by the 'random' and 'pagerank' methods).
+        method (str): 'random', 'ars' or 'pagerank'.
+        n_tests (int): Walks averaged per cell.
+        steps (int): Steps per walk, 2 * n_nodes by default.
+        seed (int): Seed of the whole sweep; every cell gets an independent stream.
+        max_workers (int): Worker processes, 1 runs the sweep in this process.
+        store (ResultsStore): Save every cell there as it finishes and skip the tests already saved.
+        graph_key (str): Key of the graph in the store, its graph_hash by default.
+
+    Returns:
+        dict: {perc: {tau: mean_curve}}, as consumed by plot_ars_by_steps_to_jump_and_perc_cl_info
+        and plot_all_percs_in_one; with a store, {perc: {tau: RunStats}} of the saved cells, which
+        hold at least n_tests tests (more when an earlier run of the sweep saved more).
+    """
+    if isinstance(G, str):
+        C = load_graph(G)[0]
+    elif isinstance(G, nx.Graph):
+        C = csr_from_graph(G)
+    else:
+        C = G
+    steps = 2 * C.n_nodes if steps is None else steps
+    if store is not None and seed is None:
+        raise Exception("a sweep saved to a store needs a seed")
+
+    information_seed, *cell_seeds = spawn_seeds(seed, 1 + len(perc_cl_info) * len(taus))
+    information_by_perc = coverage_information(C, perc_cl_info, information_seed)
+
+    # (perc, tau, first test, tests to run, seed) of every batch to run
+    cells = [(perc, tau, 0, n_tests, seed_seq)
+             for (perc, tau), seed_seq in zip([(perc, tau) for perc in perc_cl_info for tau in taus], cell_seeds)]
+    keep = None
+    if store is not None:
+        graph_key = graph_hash(C) if graph_key is None else graph_key
+        metadata = {'n_clusters': C.cluster_index.n_clusters, 'n_nodes': C.n_nodes, 'steps': steps,
+                    'percs': [float(perc) for perc in perc_cl_info], 'taus': [int(tau) for tau in taus]}
+        previous = store.metadata(graph_key, seed, method) if store.has_sweep(graph_key, seed, method) else None
+        if previous is not None and {key: previous[key] for key in metadata} != metadata:
+            raise Exception("the store holds a sweep of this graph and seed with other parameters")
+        n_saved = 0 if previous is None else previous['n_tests']
+        store.save_metadata(graph_key, seed, method, {**metadata, 'n_tests': max(n_tests, n_saved)})
+        keep = (store.every, store.capacity)
+        missing = []
+        for perc, tau, _, _, seed_seq in cells:
+            done = store.n_tests(graph_key, seed, method, tau, perc)
+            if done < n_tests:
+                missing.append((perc, tau, done, n_tests - done, batch_seed(seed_seq, done)))
+        cells = missing
+
+    def finish(perc, tau, first, result):
+        if store is None:
+            results[perc][tau] = result
+        else:
+            store.save(graph_key, seed, method, tau, perc, first, result)
+
+    results = {perc: {tau: None for tau in taus} for perc in perc_cl_info}
+    initargs = (G if isinstance(G, str) else (C.offsets, C.indices), information_by_perc)
+
+    if max_workers == 1:
+        _init_worker(*initargs)
+        for perc, tau, first, batch, seed_seq in cells:
+            finish(perc, tau, first, _run_cell(perc, tau, method, batch, steps, seed_seq, keep=keep)[2])
+    elif cells:
+        instrument = instrumentation.recording()
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=initargs) as pool:
+            futures = {pool.submit(_run_cell, perc, tau, method, batch, steps, seed_seq, instrument, keep): first
+                       for perc, tau, first, batch, seed_seq in cells}
+            for future in as_completed(futures):
+                perc, tau, result, records = future.result()
+                finish(perc, tau, futures[future], result)
+                instrumentation.merge(records)
+
+    if store is not None:
+        for perc in perc_cl_info:
+            for tau in taus:
+                results[perc][tau] = store.load(graph_key, seed, method, tau, perc, n_tests)
+    return results
@@ -0,0 +1,123 @@
+import networkx as nx
+import numpy as np
+
+import instrumentation
+
+from csr_graph import csr_from_graph
+from information import InformationState
+from seeding import batch_seed, make_rng, spawn_seeds
+from stats import RunStats
+from sweep import coverage_information
+from walk_kernels import walk_compiled
+
+#
+#   Search of the ARS tau that gathers the most information, per coverage
+#   level, by successive halving instead of a full tau grid. Every candidate
+#   tau first runs a small batch of tests; then the worse half (1 - 1/eta) of
+#   the candidates is dropped and the survivors run a batch eta times larger,
+#   until one is left or max_tests tests have been run. Poor taus cost a few
+#   tests and most of the walks go to the best region: with the default 24
+#   candidates, 640 tests per coverage level instead of the 2200 of a 22-tau
+#   grid of 100 tests, and the winner ends with 252 tests. Re-running the
+#   winner (see below) brings the level to 892 tests.
+#
+#   All the candidates of a round walk with the same random streams (common
+#   random numbers), so they are compared on the same draws, which makes the
+#   differences between taus much less noisy than the curves themselves.
+#   Only the objective of each walk is kept during the search. The winner is
+#   picked on those walks, so their mean overestimates it (winner's curse):
+#   its reported objective, interval and curve statistics come from a fresh
+#   batch of as many tests, with its own stream, run after the search.
+#
+#   The objective of a walk is its final information ('final') or the mean
+#   of its info_steps curve, i.e. the area under the curve over steps ('auc').
+#
+
+OBJECTIVES = ('final', 'auc')
+
+
+def candidate_taus(steps, n=24) -> np.ndarray:
+    """
+    0 and about n integer taus spaced geometrically between 1 and steps.
+    """
+    return np.unique(np.concatenate(([0], np.round(np.geomspace(1, steps, n))))).astype(np.int64)
+
+
+def _objective(info_steps, objective):
+    return info_steps[:, -1] if objective == 'final' else info_steps.mean(axis=1)
+
+
+def _halve(C, information, taus, objective, n_tests, eta, max_tests, steps, seed_seq, every, confidence):
+    # successive halving of one coverage level
+    walk_seed, final_seed, stats_seed = spawn_seeds(seed_seq, 3)
+    alive = list(taus)
+    values = {tau: [] for tau in alive}
+    first, batch, total_tests = 0, n_tests, 0
+
+    while True:
+        state = InformationState(information, batch)
+        for tau in alive:
+            state.reset()
+            info_steps = walk_compiled(C, 'ars', batch, steps, tau, state, make_rng(batch_seed(walk_seed, first)))
+            values[tau].extend(_objective(info_steps, objective))
+        total_tests += batch * len(alive)
+        first += batch
+        if len(alive) == 1 or first >= max_tests:
+            break
+        alive = sorted(alive, key=lambda tau: -np.mean(values[tau]))[:int(np.ceil(len(alive) / eta))]
+        batch = min(batch * eta, max_tests - first)
+
+    def summary(objectives):
+        objective_stats = RunStats(1)
+        objective_stats.add_batch(np.array(objectives)[:, np.newaxis])
+        return float(objective_stats.mean[0]), float(objective_stats.interval(confidence)[0]), objective_stats.n
+
+    # re-run the winner on fresh draws for an unbiased estimate of its objective
+    best = max(alive, key=lambda tau: np.mean(values[tau]))
+    n = len(values[best])
+    info_steps = walk_compiled(C, 'ars', n, steps, best, InformationState(information, n), make_rng(final_seed))
+    stats = RunStats(steps, every, rng=make_rng(stats_seed))
+    stats.add_batch(info_steps)
+    mean, interval, n = summary(_objective(info_steps, objective))
+    return {'tau': int(best), 'objective': mean, 'interval': interval, 'n_tests': n, 'total_tests': total_tests + n,
+            'stats': stats, 'candidates': {int(tau): summary(values[tau]) for tau in taus}}
+
+
+@instrumentation.timed('optimize_tau')
+def optimize_tau(G, perc_cl_info, taus=None, objective='final', n_tests=4, eta=2, max_tests=256, steps=None,
+                 seed=None, every=1, confidence=0.95) -> dict:
+    """
+    Find the ARS tau with the most information of each coverage level by successive halving.
+
+    Args:
+        G (nx.Graph | CSRGraph): Graph from graph_erdos / graph_with_clusters, or its compiled form.
+        perc_cl_info (list): Fractions of clusters with information, in increasing order.
+        taus (list): Candidate taus, candidate_taus(steps) by default.
+        objective (str): 'final' (information at the last step) or 'auc' (mean information over the steps).
+        n_tests (int): Tests of every candidate in the first round.
+        eta (int): Each round keeps 1 / eta of the candidates and runs eta times more tests.
+        max_tests (int): Tests after which the search stops, whatever the candidates left.
+        steps (int): Steps per walk, 2 * n_nodes by default.
+        seed (int): Seed of the search.
+        every (int): Keep one step out of every in the curve statistics.
+        confidence (float): Level of the confidence intervals.
+
+    Returns:
+        dict: {perc: result}, where result has the best 'tau', its mean 'objective' and the half-width
+        'interval' of its confidence interval over 'n_tests' fresh tests, the 'total_tests' run for the
+        level, the RunStats 'stats' of the best tau's fresh curves and the (mean, half-width, tests) of
+        every candidate during the search in 'candidates' (biased upward for the winner).
+    """
+    if objective not in OBJECTIVES:
+        raise Exception("objective must be 'final' or 'auc'")
+    C = csr_from_graph(G) if isinstance(G, nx.Graph) else G
+    steps = 2 * C.n_nodes if steps is None else steps
+    taus = candidate_taus(steps) if taus is None else np.asarray(taus, dtype=np.int64)
+    if taus.max() > steps:
+        raise Exception("tau must be less than steps")
+
+    information_seed, *perc_seeds = spawn_seeds(seed, 1 + len(perc_cl_info))
+    information_by_perc = coverage_information(C, perc_cl_info, information_seed)
+    return {perc: _halve(C, information_by_perc[perc], taus, objective, n_tests, eta, max_tests, steps, seed_seq,
+                         every, confidence)
+            for perc, seed_seq in zip(perc_cl_info, perc_seeds)}
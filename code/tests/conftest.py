@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the modules of code/ import each other by name, as when run from that directory
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
@@ -0,0 +1,78 @@
+import os
+
+import numpy as np
+import pytest
+
+import sweep
+from csr_graph import csr_from_graph, graph_hash
+from graph import graph_erdos
+from results_store import ResultsStore
+
+PERCS, TAUS = [0.5, 1], [0, 3]
+
+
+@pytest.fixture
+def graph():
+    return graph_erdos(4, 15, rng=1)
+
+
+def _sweep(G, store, n_tests):
+    return sweep.run_sweep(G, PERCS, TAUS, n_tests=n_tests, steps=20, seed=3, max_workers=1, store=store)
+
+
+def _assert_same(results, other):
+    for perc in PERCS:
+        for tau in TAUS:
+            a, b = results[perc][tau], other[perc][tau]
+            assert a.n == b.n
+            for name, array in a.to_dict().items():
+                assert np.array_equal(array, b.to_dict()[name])
+
+
+@pytest.fixture
+def cell_runs(monkeypatch):
+    # (perc, tau, tests) of every cell the sweeps run
+    runs = []
+    run_cell = sweep._run_cell
+
+    def counting(perc, tau, method, n_tests, *args, **kwargs):
+        runs.append((perc, tau, n_tests))
+        return run_cell(perc, tau, method, n_tests, *args, **kwargs)
+
+    monkeypatch.setattr(sweep, '_run_cell', counting)
+    return runs
+
+
+def test_resume_runs_nothing_and_returns_the_saved_cells(graph, tmp_path, cell_runs):
+    store = ResultsStore(str(tmp_path), capacity=8)
+    first = _sweep(graph, store, 10)
+    assert len(cell_runs) == len(PERCS) * len(TAUS)
+
+    cell_runs.clear()
+    _assert_same(first, _sweep(graph, store, 10))
+    assert cell_runs == []
+
+
+def test_resume_after_a_crash_reproduces_the_sweep(graph, tmp_path):
+    store = ResultsStore(str(tmp_path / 'crashed'), capacity=8)
+    _sweep(graph, store, 10)
+    # a crash before the last cell was saved
+    cell = (graph_hash(csr_from_graph(graph)), 3, 'ars', TAUS[-1], PERCS[-1])
+    for first, stop in store.chunks(*cell):
+        os.remove(os.path.join(store._cell_dir(*cell), f'tests{first}-{stop}.npz'))
+
+    _assert_same(_sweep(graph, ResultsStore(str(tmp_path / 'whole'), capacity=8), 10), _sweep(graph, store, 10))
+
+
+def test_fewer_tests_than_saved_returns_the_saved_cells(graph, tmp_path, cell_runs):
+    store = ResultsStore(str(tmp_path), capacity=8)
+    _sweep(graph, store, 20)
+    cell_runs.clear()
+
+    results = _sweep(graph, store, 10)
+    assert cell_runs == []
+    assert all(results[perc][tau].n == 20 for perc in PERCS for tau in TAUS)
+
+    extended = _sweep(graph, store, 30)
+    assert all(n_tests == 10 for _, _, n_tests in cell_runs)
+    assert all(extended[perc][tau].n == 30 for perc in PERCS for tau in TAUS)
@@ -0,0 +1,33 @@
+import numpy as np
+
+from stats import RunStats
+
+
+def test_merge_matches_concatenated_curves():
+    curves = np.cumsum(np.random.default_rng(0).random((150, 40)), axis=1)
+    merged = RunStats(40, capacity=200, rng=1)
+    merged.add_batch(curves[:60])
+    other = RunStats(40, capacity=200, rng=2)
+    for curve in curves[60:]:
+        other.add(curve)
+    merged.merge(other)
+
+    assert merged.n == len(curves)
+    assert np.allclose(merged.mean, curves.mean(axis=0))
+    assert np.allclose(merged.variance, curves.var(axis=0))
+    assert np.array_equal(merged.min, curves.min(axis=0))
+    assert np.array_equal(merged.max, curves.max(axis=0))
+    # every curve fits in the sketch, so its quantiles are exact
+    assert np.allclose(merged.quantile(0.25), np.quantile(curves[:, merged.sketch_index], 0.25, axis=0))
+
+
+def test_merge_keeps_checkpoints():
+    curves = np.cumsum(np.random.default_rng(3).random((20, 100)), axis=1)
+    merged, other = RunStats(100, every=7), RunStats(100, every=7)
+    merged.add_batch(curves[:5])
+    other.add_batch(curves[5:])
+    merged.merge(other)
+
+    assert merged.index[-1] == 99
+    assert np.allclose(merged.mean, curves[:, merged.index].mean(axis=0))
+    assert np.allclose(merged.variance, curves[:, merged.index].var(axis=0))
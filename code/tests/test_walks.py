@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from csr_graph import csr_from_graph
+from csr_walking import ars_walk_csr, pagerank_walk_csr, random_walk_csr, walk_batch
+from graph import graph_add_information, graph_erdos, graph_with_clusters
+from information import InformationState
+from walk_kernels import NUMBA_AVAILABLE, walk_compiled
+from walking import ars_walk, pagerank_walk, random_walk
+
+WALKS = [
+    (random_walk, random_walk_csr, 'random', {}),
+    (ars_walk, ars_walk_csr, 'ars', {'tau': 3}),
+    (pagerank_walk, pagerank_walk_csr, 'pagerank', {}),
+]
+
+
+@pytest.fixture(scope='module', params=['erdos', 'with_clusters'])
+def graph(request):
+    if request.param == 'erdos':
+        G = graph_erdos(6, 15, rng=2)
+        graph_add_information(G, 0.5, rng=2)
+    else:
+        G = graph_with_clusters(5, 60, rng=4)
+    return G
+
+
+@pytest.mark.parametrize('walk, walk_csr, method, kwargs', WALKS)
+def test_networkx_and_csr_walks_follow_the_same_path(graph, walk, walk_csr, method, kwargs):
+    state = InformationState.from_graph(graph, 1)
+    info_steps = walk(graph, 0, 200, state=state, rng=5, **kwargs)
+    assert np.allclose(info_steps, walk_csr(csr_from_graph(graph), 200, rng=5, **kwargs))
+
+
+@pytest.mark.parametrize('walk, walk_csr, method, kwargs', WALKS)
+def test_compiled_walks(graph, walk, walk_csr, method, kwargs):
+    C = csr_from_graph(graph)
+    tau = kwargs.get('tau', 5)
+    compiled = walk_compiled(C, method, 400, 60, tau, rng=7)
+    batch = walk_batch(C, method, 400, 60, tau, rng=7)
+    if not NUMBA_AVAILABLE:
+        assert np.array_equal(compiled, batch)
+        return
+
+    # the kernels draw walker by walker, as the single CSR walks
+    rng = np.random.default_rng(7)
+    assert np.allclose(compiled[:3], [walk_csr(C, 60, rng=rng, **kwargs) for _ in range(3)])
+    # and the lockstep walk_batch draws other numbers for the same walks
+    error = np.sqrt(compiled[:, -1].var() / len(compiled) + batch[:, -1].var() / len(batch))
+    assert abs(compiled[:, -1].mean() - batch[:, -1].mean()) < 4 * error
@@ -0,0 +1,175 @@
+import numpy as np
+
+from csr_graph import CSRGraph
+from csr_walking import walk_batch
+from information import InformationState
+from instrumentation import count, timed
+from sampling import csr_neighbor, other_index
+from seeding import make_rng
+from walking import PAGERANK_PROB
+
+try:
+    import numba
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+#
+#   Compiled walk loops. The kernels below are plain Python functions over
+#   the CSR arrays; when numba is installed they are compiled at import (the
+#   first call of each one pays the compilation, cached on disk afterwards)
+#   and walk_compiled runs one walker after the other through them. Without
+#   numba, walk_compiled falls back to the vectorized walk_batch, several
+#   times faster than the kernels run as Python. walk_batch draws its random
+#   numbers step by step for all the walkers instead of walker by walker, so
+#   the curves of a seed follow the same distribution but are not the same
+#   with and without numba: results are only reproducible within one engine.
+#
+#   A kernel walks one walker from node 0 and collects the information of
+#   an InformationState row: node k is consumed when marks[k] == epoch. The
+#   random draws are made outside, with the same calls as the walks of
+#   csr_walking.py, so a compiled walk and random_walk_csr / ars_walk_csr /
+#   pagerank_walk_csr given the same rng follow exactly the same path. The
+#   kernels return their teleports (random, PageRank) or their jumps and
+#   resets (ARS), which walk_compiled reports to instrumentation.
+#
+
+
+def _jit(function):
+    if not NUMBA_AVAILABLE:
+        return function
+    return numba.njit(cache=True, nogil=True)(function)
+
+
+_csr_neighbor = _jit(csr_neighbor)
+_other_index = _jit(other_index)
+
+
+@_jit
+def random_walk_kernel(offsets, indices, values, marks, epoch, draws, out):
+    n_nodes = len(offsets) - 1
+    current_node = 0
+    actual_info = 0.0
+    teleports = 0
+
+    for i in range(len(out)):
+        next_hop = _csr_neighbor(offsets, indices, current_node, draws[i])
+        if next_hop < 0:
+            next_hop = _other_index(n_nodes, current_node, draws[i])
+            teleports += 1
+        current_node = next_hop
+        if marks[current_node] != epoch:
+            actual_info += values[current_node]
+            marks[current_node] = epoch
+        out[i] = actual_info
+
+    return teleports
+
+
+@_jit
+def ars_walk_kernel(offsets, indices, values, marks, epoch, tau, draws, out):
+    n_nodes = len(offsets) - 1
+    current_node = 0
+    actual_info = 0.0
+    t = 0
+    jumps = 0
+    resets = 0
+
+    for i in range(len(out)):
+        next_hop = -1 if t >= tau else _csr_neighbor(offsets, indices, current_node, draws[i])
+        if next_hop < 0:
+            next_hop = int(draws[i] * n_nodes)
+            jumps += 1
+        current_node = next_hop
+
+        info_to_add = 0.0
+        if marks[current_node] != epoch:
+            info_to_add = values[current_node]
+            marks[current_node] = epoch
+
+        if info_to_add > 0:
+            t = 0
+            resets += 1
+        else:
+            t += 1
+
+        actual_info += info_to_add
+        out[i] = actual_info
+
+    return jumps, resets
+
+
+@_jit
+def pagerank_walk_kernel(offsets, indices, values, marks, epoch, coin_flips, draws, out):
+    n_nodes = len(offsets) - 1
+    current_node = 0
+    actual_info = 0.0
+    teleports = 0
+
+    for i in range(len(out)):
+        next_hop = -1
+        if coin_flips[i] >= PAGERANK_PROB:
+            next_hop = _csr_neighbor(offsets, indices, current_node, draws[i])
+        if next_hop < 0:
+            next_hop = _other_index(n_nodes, current_node, draws[i])
+            teleports += 1
+        current_node = next_hop
+        if marks[current_node] != epoch:
+            actual_info += values[current_node]
+            marks[current_node] = epoch
+        out[i] = actual_info
+
+    return teleports
+
+
+@timed('walk_compiled')
+def walk_compiled(C: CSRGraph, method, n_walkers, steps=10, tau=5, information=None, rng=None,
+                  out=None) -> np.ndarray:
+    """
+    Run n_walkers walks of the given method with the compiled kernels.
+
+    Same arguments and result as csr_walking.walk_batch, except that information
+    must be an InformationState (or None); without numba walk_batch is called,
+    whose curves differ from the compiled ones for the same rng.
+
+    Returns:
+        np.ndarray: (n_walkers, steps) matrix, row k is the info_steps curve of walker k.
+    """
+    if not NUMBA_AVAILABLE:
+        return walk_batch(C, method, n_walkers, steps, tau, information, rng, out)
+    if method not in ('random', 'ars', 'pagerank'):
+        raise Exception("method must be one of 'random', 'ars' or 'pagerank'")
+    if method == 'ars' and tau > steps:
+        raise Exception("tau must be less than steps")
+
+    rng = make_rng(rng)
+    if information is None:
+        information = InformationState(C.information, n_walkers)
+    elif not isinstance(information, InformationState) or information.n_walkers != n_walkers:
+        raise Exception("information must be an InformationState with n_walkers walkers")
+    info_steps = np.empty((n_walkers, steps)) if out is None else out
+
+    offsets, indices, values = C.offsets, C.indices, information.values
+    teleports = jumps = resets = 0
+    for k in range(n_walkers):
+        marks, epoch = information._marks[k], information._epochs[k]
+        if method == 'random':
+            teleports += random_walk_kernel(offsets, indices, values, marks, epoch, rng.random(steps),
+                                            info_steps[k])
+        elif method == 'ars':
+            walker_jumps, walker_resets = ars_walk_kernel(offsets, indices, values, marks, epoch, tau,
+                                                          rng.random(steps), info_steps[k])
+            jumps += walker_jumps
+            resets += walker_resets
+        else:
+            coin_flips = rng.random(steps)
+            teleports += pagerank_walk_kernel(offsets, indices, values, marks, epoch, coin_flips,
+                                              rng.random(steps), info_steps[k])
+
+    count('steps', n_walkers * steps)
+    if method == 'ars':
+        count('jumps', jumps)
+        count('resets', resets)
+    else:
+        count('teleports', teleports)
+    return info_steps
@@ -1,93 +1,122 @@
 import networkx as nx
-import numpy as np
 import pylab
-import random
 
 from typing import Any
 from matplotlib import pyplot as plt
 
+from instrumentation import count, timed
+from sampling import csr_neighbor, neighbor_arrays, other_index
+from seeding import make_rng
+
 
 PAGERANK_PROB = 0.5
 
 
-def random_walk(G: nx.Graph, test_index, steps=10) -> Any | None:
-    start_node = str(list(G.nodes)[0])
-    current_node = start_node
+#
+#   The walks return the cumulative information after each step, as a list,
+#   or written into out (e.g. a row of a preallocated array) when it is given.
+#   Their steps, jumps, resets and teleports are reported to instrumentation.
+#
+#   The moves are drawn over the neighbour arrays of the graph (see
+#   sampling.neighbor_arrays), one uniform number per step as the walks of
+#   csr_walking.py, so a walk and its CSR version given the same rng follow
+#   the same path.
+#
+
+
+def _consume_information(G: nx.Graph, node, test_index, state):
+    # with a state the graph is only read, otherwise the test slot is zeroed
+    if state is not None:
+        return state.take(state.index[node], test_index)
+    info = G.nodes[node]['information'][test_index]
+    G.nodes[node]['information'][test_index] = 0
+    return info
+
+
+@timed('walk.random')
+def random_walk(G: nx.Graph, test_index, steps=10, state=None, rng=None, out=None) -> Any | None:
+    rng = make_rng(rng)
+    nodes, offsets, indices = neighbor_arrays(G)
+    draws = rng.random(steps)
+    current_node = 0
     actual_info = 0
-    info_steps = []
+    info_steps = [0] * steps if out is None else out
+    teleports = 0
 
     for i in range(steps):
-        neighbors = list(G.neighbors(current_node))
-        if len(neighbors) == 0:
-            next_hop = random.choice(list(G.nodes))
-            while next_hop == current_node:
-                next_hop = random.choice(list(G.nodes))
-        else:
-            next_hop = random.choice(neighbors)
-            while next_hop == current_node:
-                next_hop = random.choice(neighbors)
+        next_hop = csr_neighbor(offsets, indices, current_node, draws[i])
+        if next_hop < 0:
+            next_hop = other_index(len(nodes), current_node, draws[i])
+            teleports += 1
         current_node = next_hop
-        actual_info += G.nodes[current_node]['information'][test_index]
-        info_steps.append(actual_info)
-        G.nodes[current_node]['information'][test_index] = 0
+        actual_info += _consume_information(G, nodes[current_node], test_index, state)
+        info_steps[i] = actual_info
 
+    count('steps', steps)
+    count('teleports', teleports)
     return info_steps
 
 
-def ars_walk(G: nx.Graph, test_index, steps=10, tau=5) -> Any | None:
+@timed('walk.ars')
+def ars_walk(G: nx.Graph, test_index, steps=10, tau=5, state=None, rng=None, out=None) -> Any | None:
     if tau > steps:
         raise Exception("tau must be less than steps")
 
-    current_node = str(list(G.nodes)[0])
+    rng = make_rng(rng)
+    nodes, offsets, indices = neighbor_arrays(G)
+    draws = rng.random(steps)
+    current_node = 0
     actual_info = 0
-    info_steps = []
+    info_steps = [0] * steps if out is None else out
     t = 0
+    jumps = resets = 0
 
-    for _ in range(steps):
-        if t >= tau:
-            current_node = random.choice(list(G.nodes))
-        else:
-            current_node = random.choice(list(G.neighbors(current_node)))
+    for i in range(steps):
+        next_hop = -1 if t >= tau else csr_neighbor(offsets, indices, current_node, draws[i])
+        if next_hop < 0:
+            # jump: tau steps without information, or nowhere to move
+            next_hop = int(draws[i] * len(nodes))
+            jumps += 1
+        current_node = next_hop
 
-        info_to_add = G.nodes[current_node]['information'][test_index]
+        info_to_add = _consume_information(G, nodes[current_node], test_index, state)
 
         if info_to_add > 0:
             t = 0
+            resets += 1
         else:
             t += 1
 
         actual_info += info_to_add
-        info_steps.append(actual_info)
-        G.nodes[current_node]['information'][test_index] = 0
+        info_steps[i] = actual_info
 
+    count('steps', steps)
+    count('jumps', jumps)
+    count('resets', resets)
     return info_steps
 
 
-def pagerank_walk(G: nx.Graph, test_index, steps=10) -> Any | None:
-    start_node = str(list(G.nodes)[0])
-    current_node = start_node
+@timed('walk.pagerank')
+def pagerank_walk(G: nx.Graph, test_index, steps=10, state=None, rng=None, out=None) -> Any | None:
+    rng = make_rng(rng)
+    nodes, offsets, indices = neighbor_arrays(G)
+    coin_flips = rng.random(steps)
+    draws = rng.random(steps)
+    current_node = 0
     actual_info = 0
-    info_steps = []
+    info_steps = [0] * steps if out is None else out
+    teleports = 0
 
     for i in range(steps):
-        coin_flip = np.random.rand()
-        neighbors = list(G.neighbors(current_node))
-
-        if coin_flip < PAGERANK_PROB or len(neighbors) == 0:
-            next_hop = random.choice(list(G.nodes))
-            while next_hop == current_node:
-                next_hop = random.choice(list(G.nodes))
-        else:
-            next_hop = random.choice(list(neighbors))
-            while next_hop == current_node:
-                next_hop = random.choice(list(neighbors))
-
-        if next_hop is None:
-            return None
+        next_hop = -1 if coin_flips[i] < PAGERANK_PROB else csr_neighbor(offsets, indices, current_node, draws[i])
+        if next_hop < 0:
+            next_hop = other_index(len(nodes), current_node, draws[i])
+            teleports += 1
 
         current_node = next_hop
-        actual_info += G.nodes[current_node]['information'][test_index]
-        info_steps.append(actual_info)
-        G.nodes[current_node]['information'][test_index] = 0
+        actual_info += _consume_information(G, nodes[current_node], test_index, state)
+        info_steps[i] = actual_info
 
+    count('steps', steps)
+    count('teleports', teleports)
     return info_steps